@@ -0,0 +1,54 @@
+# memory benchmark - footprint of one instruction (ADD with three operands), one variable and one data stack item,
+# measured with tracemalloc, for the classes of interpret.py and for copies of them without __slots__
+# usage: python bench/memory.py [path to interpret.py] [count]
+
+import sys, os, tracemalloc, importlib.util
+
+def loadInterpreter(path: str):
+    spec = importlib.util.spec_from_file_location("interpret", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def unslotted(cls):
+    # the same class with a per-instance __dict__
+    slots = getattr(cls, "__slots__", ())
+    return type(cls.__name__, (), {key: value for key, value in vars(cls).items()
+                                   if key not in slots and key not in ("__slots__", "__dict__", "__weakref__")})
+
+def footprint(make, count: int) -> float:
+    # bytes per object made by make(i), with its entry in the list which keeps it alive
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [make(i) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(objects)
+
+def measure(Instruction, Argument, Variable, count: int) -> list:
+    # operands are made before measuring, like the strings and ints read from the XML source
+    names = ["GF@v%d" % i for i in range(count)]
+    numbers = list(range(count))
+    def instruction(i):
+        inst = Instruction("ADD", numbers[i], numbers[i])
+        inst.arguments = [Argument(names[i], "var"), Argument(names[i], "var"), Argument(numbers[i], "int")]
+        return inst
+    if Variable.__init__.__code__.co_argcount == 3:     # Variable(frame, name) since the names are pre-split
+        variable = lambda i: Variable("GF@", names[i][3:])
+    else:
+        variable = lambda i: Variable(names[i])
+    return [footprint(instruction, count), footprint(variable, count), footprint(lambda i: ("int", numbers[i]), count)]
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interpret.py")
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    interpret = loadInterpreter(path)
+    classes = (interpret.Instruction, interpret.Argument, interpret.Variable)
+    plain = measure(*[unslotted(cls) for cls in classes], count)
+    slotted = measure(*classes, count)
+    print("%-16s %17s %12s" % ("", "without __slots__", "as loaded"))
+    for name, before, after in zip(("instruction", "variable", "data stack item"), plain, slotted):
+        print("%-16s %15.1f B %10.1f B" % (name, before, after))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# output benchmark - a loop of WRITE int and WRITE string, stdout goes to a file, with the default and no output buffer
+# usage: python bench/output.py [path to interpret.py] [iterations]
+
+import sys, os, io, time, tempfile, importlib.util
+
+def loadInterpreter(path: str):
+    spec = importlib.util.spec_from_file_location("interpret", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def source(instructions: list) -> bytes:
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">']
+    for order, (opcode, args) in enumerate(instructions, 1):
+        lines.append('<instruction order="%d" opcode="%s">' % (order, opcode) +
+                     "".join('<arg%d type="%s">%s</arg%d>' % (n, typ, value, n) for n, (typ, value) in enumerate(args, 1)) +
+                     "</instruction>")
+    lines.append("</program>")
+    return "\n".join(lines).encode()
+
+def run(interpret, xml: bytes, path: str, bufferSize: int) -> float:
+    with open(path, mode = "w") as out:
+        start = time.perf_counter()
+        code = interpret.interpret(io.BytesIO(xml), io.StringIO(), out, sys.stderr, bufferSize=bufferSize)
+        elapsed = time.perf_counter() - start
+    if code != 0:
+        sys.exit("the benchmark program ended with %d" % code)
+    return elapsed
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "interpret.py")
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    interpret = loadInterpreter(path)
+    xml = source([("DEFVAR", [("var", "GF@i")]), ("MOVE", [("var", "GF@i"), ("int", "0")]), ("LABEL", [("label", "loop")]),
+                  ("ADD", [("var", "GF@i"), ("var", "GF@i"), ("int", "1")]), ("WRITE", [("var", "GF@i")]),
+                  ("WRITE", [("string", "\\010")]), ("JUMPIFNEQ", [("label", "loop"), ("var", "GF@i"), ("int", str(count))])])
+    outputs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, bufferSize in (("buffered", interpret.outputBufferSize), ("--output-buffer 0", 0)):
+            out = os.path.join(directory, name)
+            best = min(run(interpret, xml, out, bufferSize) for attempt in range(3))
+            print("%-20s %8.1f ms" % (name, best * 1000))
+            with open(out) as f:
+                outputs.append(f.read())
+    print("same output" if outputs[0] == outputs[1] else "DIFFERENT OUTPUT")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,35 @@
 # author: Michal Belovec, xbelov04
 
-import re, sys, xml.etree.ElementTree as ET, argparse
+import re, sys, os, io, time, traceback, argparse, hashlib, marshal, mmap
 
+constTypes = ("int", "string", "bool", "nil")
 
-class Item:
-    def __init__(self, argumentValue, argumentType):
-        self.value = argumentValue
-        self.type = argumentType
 class Argument:
+    __slots__ = ("value", "type", "item", "frame", "name", "slot")
     def __init__(self, argumentValue, argumentType):
         self.value = argumentValue
         self.type = argumentType
+        self.item = (argumentType, argumentValue) if argumentType in constTypes else None   # typed value of a constant
+        self.frame = sys.intern(argumentValue[:3]) if argumentType == "var" else None   # GF@, LF@ or TF@ of a variable
+        self.name = sys.intern(argumentValue[3:]) if argumentType == "var" else None    # name of a variable in its frame
+        self.slot = None    # index of a GF variable in Interpreter.globals, set by decode()
     def getValue(self):
         return self.value
     def getType(self):
         return self.type
 
 class Instruction:
+    __slots__ = ("name", "order", "line", "index", "arguments", "target", "fused", "quick")
     def __init__(self, instructionName, instructionOrder, instructionLine):
         self.name = instructionName
         self.order = instructionOrder
-        self.line = instructionLine
+        self.line = instructionLine    # position in the loaded program, for error reporting
+        self.index = None   # index in code, set by decode() and optimize()
         self.arguments = []
+        self.target = None  # index after label for CALL, JUMP, JUMPIFEQ and JUMPIFNEQ,
+                            # (index if false, index if true) for LT, GT and EQ fused with a jump
+        self.fused = None   # the next instruction, run by the fused handler of this one
+        self.quick = None   # generic handler if the instruction starts as ADAPTIVE, see quicken()
     def getName(self):
         return self.name
     def getOrder(self):
@@ -32,40 +40,71 @@ class Instruction:
         self.arguments.append(argument)
 
 class Variable:
-    def __init__(self, variableName):
-        self.name = variableName[3:]    #name of var
-        self.frame = variableName[:3]  #GF@, LF@ alebo TF@
-        self.value = None
-        self.type = None
-    def addValues(self, variableValue, variableType): 
-        self.value = variableValue
-        self.type = variableType
+    __slots__ = ("name", "frame", "item")
+    def __init__(self, variableFrame, variableName):
+        self.name = variableName    #name of var, interned by Argument
+        self.frame = variableFrame  #GF@, LF@ alebo TF@
+        self.item = None    # (type, value), None if not initialized
     def getName(self):
         return self.name
     def getValue(self):
-        return self.value
+        return None if self.item is None else self.item[1]
     def getFrame(self):
         return self.frame
     def getType(self):
-        return self.type
+        return None if self.item is None else self.item[0]
     def __str__(self):
-        return f"{self.name}, {self.value}, {self.type}"
+        return f"{self.name}, {self.getValue()}, {self.getType()}"
     
 class Label:
+    __slots__ = ("name", "line")
     def __init__(self, labelName, labelLine):
         self.name = labelName
         self.line = labelLine
 
+class Frame:
+    __slots__ = ("vars",)
+    def __init__(self):
+        self.vars = {}  # name of var -> Variable
+    def add(self, var: Variable):
+        self.vars[var.name] = var
+    def get(self, name: str) -> Variable:
+        return self.vars.get(name)
+    def __contains__(self, name: str):
+        return name in self.vars
+    def __iter__(self):
+        return iter(self.vars.values())
+    def __len__(self):
+        return len(self.vars)
+
+class Block:
+    __slots__ = ("start", "stop", "body", "last", "successors", "predecessors")
+    def __init__(self, start: int, stop: int):
+        self.start = start  # index of the first instruction in code
+        self.stop = stop    # index after the last instruction
+        self.body = []  # (handler, instruction) which continue with the next one, fused pairs as one
+        self.last = None    # (handler, instruction) which ends the block, it can jump
+        self.successors = []    # start indexes of blocks which can follow, len(code) for the end
+        self.predecessors = []
+    def copy(self):
+        # own steps for one run, quickening rewrites their handlers
+        block = Block(self.start, self.stop)
+        block.body = list(self.body)
+        block.last = self.last
+        block.successors = self.successors
+        block.predecessors = self.predecessors
+        return block
+
 class Program:
     def __init__(self):
         self.instructions = []
-        self.labels = []
-        self.gf = [] # global frame
-        self.lf = None  # local frame
-        self.tf = None  # temporary frame
-        self.frameStack = []    # stack for frames
-        self.callStack = [] # stack for calls
-        self.dataStack = [] # stack for data
+        self.code = []  # decoded instructions - (handler, instruction)
+        self.labels = {}    # name of label -> index after the label in code
+        self.blocks = []    # control flow graph - basic blocks of code in order
+        self.blockAt = []   # index -> Block starting there, None inside blocks
+        self.native = None  # functions of translated blocks by index, None runs in the interpreter
+        self.specialized = 0    # instructions with check-free handlers
+        self.globalSlots = {}   # name of GF variable -> index in Interpreter.globals
     
     #instructions
     def addInstruction(self, instruction: Instruction):
@@ -73,50 +112,7 @@ class Program:
 
     #labels
     def addLabel(self, label: Label):
-        self.labels.append(label)
-
-    #global frame
-    def addGF(self, var: Variable):
-        self.gf.append(var)
-    def existedGF(self, var: Variable):
-        for j in self.gf:
-            if var.getName() == j.name:
-                sys.stderr.write("ERROR: Attempt to redefine variable.\n")
-                exit(52)
-
-    #local frame
-    def initLF(self):
-        self.lf = []
-    def addLF(self, var: Variable):
-        if self.lf is None:
-            sys.stderr.write("ERROR: Local rame doesn't exist.\n")
-            exit(55)
-        self.lf.append(var)
-    def existedLF(self, var: Variable):
-        if self.lf is None:
-            sys.stderr.write("ERROR: Local rame doesn't exist.\n")
-            exit(55)
-        for j in self.lf:
-            if var.getName() == j.name:
-                sys.stderr.write("ERROR: Attempt to redefine variable.\n")
-                exit(52)
-
-    #temporary frame
-    def initTF(self):
-        self.tf = []
-    def addTF(self, var: Variable):
-        if self.tf is None:
-            sys.stderr.write("ERROR: Temporary frame doesn't exist.\n")
-            exit(55)
-        self.tf.append(var)
-    def existedTF(self, var: Variable):
-        if self.tf is None:
-            sys.stderr.write("ERROR: Temporary frame doesn't exist.\n")
-            exit(55)
-        for j in self.tf:
-            if var.getName() == j.name:
-                sys.stderr.write("ERROR: Attempt to redefine variable.\n")
-                exit(52)
+        self.labels[label.name] = label.line
 
 # constants
 argVar = ("var")
@@ -127,1184 +123,1905 @@ argBool = ("bool", "var")
 argNil = ("nil", "var")
 argLabel = ("label")
 argType = ("type")
+branchInst = ("CALL", "JUMP", "JUMPIFEQ", "JUMPIFNEQ")
+argSlots = {"arg1": 0, "arg2": 1, "arg3": 2}
+cacheVersion = 1
+cacheTypes = {"int": int, "bool": bool, "nil": type(None), "string": str, "var": str, "label": str, "type": str}   # type of argument -> type of its value
+limitExit = 59  # a limit given by --max-steps, --timeout, --max-stack or --max-string was hit
+checkInterval = 4096
+outputBufferSize = 1 << 16
+inputChunkSize = 1 << 20
+ropeSize = 256  # strings at least this long are concatenated and changed through Rope
+undefined = Variable("GF@", "")  # placeholder in Interpreter.globals for GF variables before their DEFVAR
+TRUE = ("bool", True)
+FALSE = ("bool", False)
+
+quickenAfter = 8   # runs with the same operand types before an instruction is quickened
+
+class InterpretExit(Exception):
+    def __init__(self, code: int, message=None):
+        super().__init__(message)
+        self.code = code    # exit code of the interpreter
+        self.message = message  # None for EXIT instruction
+
+def error(message: str, code: int):
+    raise InterpretExit(code, message)
 
 def fix(word: str) -> str:
     return re.sub("[ \t\n]*", "", word)
 
-def checkLabel(name: str):
-    for g in p.labels:
-        if g.name == name:
-            exit(52)
+def parseInt(word: str) -> int:
+    # decimal, 0x1F or 0o17 with an optional sign, int() alone would take also 0b11 and 1_000
+    match = re.fullmatch(r"[+-]?(?:(0[xX][0-9a-fA-F]+)|(0[oO][0-7]+)|[0-9]+)", word)
+    if match is None:
+        raise ValueError(word)
+    return int(word, 16 if match.group(1) else 8 if match.group(2) else 10)
 
-def checkType(instruction: Instruction, num: int, arg1, arg2, arg3):
-    
-    if arg1 is None:
-        return
-    if instruction.arguments[0].type not in arg1:
-            sys.stderr.write("ERROR: Wrong type of instruction argument.\n")
-            exit(53)
-    if arg2 is None:
-        return
-    if instruction.arguments[1].type not in arg2:
-            sys.stderr.write("ERROR: Wrong type of instruction argument.\n")
-            exit(53)
-    if arg3 is None:
-        return
-    if instruction.arguments[2].type not in arg3:
-            sys.stderr.write("ERROR: Wrong type of instruction argument.\n")
-            exit(53)
-
-def gfIndex(var: str):
-    index = 0
-    for v in p.gf:
-        if v.name == var:
-            return index
-        index = index + 1
-    sys.stderr.write("ERROR: Variable was not defined.\n")
-    exit(54)
-
-def lfIndex(var: str):
-    index = 0
-    if p.lf is None: exit(55)
-    for v in p.lf:
-        if v.name == var:
-            return index
-        index = index + 1
-    sys.stderr.write("ERROR: Variable was not defined.\n")
-    exit(54)
-def tfIndex(var: str):
-    index = 0
-    if p.tf is None: exit(55)
-    for v in p.tf:
-        if v.name == var:
-            return index
-        index = index + 1
-    sys.stderr.write("ERROR: Variable was not defined.\n")
-    exit(54)
-
-def find(var: str) -> Variable:
-    name = var[3:]
-    frame = var[:3]
-    found = False
-    index = 0
-    if frame == "GF@":
-        for v in p.gf:
-            if v.name == name:
-                found = True
-                break
-            index = index + 1
-        if found is False:
-            sys.stderr.write("ERROR: Variable was not defined.\n")
-            exit(54)
-        return p.gf[index]
-
-    if frame == "LF@":
-        if not p.existedLF:
-            sys.stderr.write("ERROR: Local frame isn't existed.\n")
-            exit(55)
-        for v in p.lf:
-            if v.name == name:
-                found = True
-                break
-            index = index + 1
-        if found is False:
-            sys.stderr.write("ERROR: Variable was not defined.\n")
-            exit(54)
-        return p.lf[index]
-
-    if frame == "TF@":
-        if not p.existedTF:
-            sys.stderr.write("ERROR: Local frame isn't existed.\n")
-            exit(55)
-        for v in p.tf:
-            if v.name == name:
-                found = True
-                break
-            index = index + 1
-        if found is False:
-            sys.stderr.write("ERROR: Variable was not defined.\n")
-            exit(54)
-        return p.tf[index]
-
-def indexWrite(val, typ, var):
-    frame = var[:3]
-    name = var[3:]
-    if frame == 'GF@':
-        index = gfIndex(name)
-        p.gf[index].addValues(val, typ)
-        # print(p.gf[index])
-    elif frame == 'LF@':
-        index = lfIndex(name)
-        p.lf[index].addValues(val, typ)
-        # print(p.lf[index])
-    elif frame == 'TF@':
-        index = tfIndex(name)
-        p.tf[index].addValues(val, typ)
-        # print(p.tf[index])
-
-def nonDeclared(var: Variable):
-    if var.value is None or var.type is None:
-        sys.stderr.write("ERROR: Undeclared variable.\n")
-        exit(56)
-
-#instructions
-def MOVE(instruction: Instruction):
-    
-
-    val = instruction.arguments[1].value
-    typ = instruction.arguments[1].type
+def escape(text: str) -> str:
+    # string@ form of a decoded string - white space, control characters, # and \ as \ddd
+    return "".join(char if ord(char) > 32 and char not in "#\\" else "\\%03d" % ord(char) for char in text)
 
-    indexWrite(val, typ, instruction.arguments[0].value)
+def unescape(match) -> str:
+    if match.group(1) is None:
+        error("Wrong escape sequence in string.", 32)
+    return chr(int(match.group(1)))
 
+def literal(typ: str, text):
+    word = fix(text) if text is not None else ""
+    if typ == "int":
+        try:
+            return parseInt(word)
+        except ValueError:
+            error("Wrong value of int.", 32)
+    if typ == "bool":
+        if word not in ("true", "false"):
+            error("Wrong value of bool.", 32)
+        return word == "true"
+    if typ == "nil":
+        if word != "nil":
+            error("Wrong value of nil.", 32)
+        return None
+    if typ == "string":
+        return re.sub(r"\\(\d{3})?", unescape, word)
+    if typ == "type" and word not in ("int", "bool", "string", "nil"):
+        error("Wrong value of type.", 32)
+    return word     # var, label or type
+
+def toStr(typ: str, val) -> str:
+    if typ == "bool":
+        return "true" if val else "false"
+    if typ == "nil":
+        return ""
+    return str(val)
 
-    # else:   #it is int, bool, string or nil
-
-def CREATEFRAME(instruction: Instruction):
-    p.initTF()
+def equal(typ1: str, val1, typ2: str, val2) -> bool:
+    if typ1 != typ2 and typ1 != "nil" and typ2 != "nil":
+        error("Different types of operands.", 53)
+    return typ1 == typ2 and val1 == val2
 
-def PUSHFRAME(instruction: Instruction):
-    if p.tf is None:
-        sys.stderr.write("ERROR: Temporary frame does not exist.\n")
-        exit(55)
-    
-    p.frameStack.append(p.lf)
-    p.lf = p.tf
-    p.tf = None
-
-def POPFRAME(instruction: Instruction):
-    if p.lf is None:
-        sys.stderr.write("ERROR: Temporary frame does not exist.\n")
-        exit(55)
-    
-    p.tf = p.lf
-    length = len(p.frameStack)
-    if length == 0:
-        sys.stderr.write("ERROR: Frame stack is empty.\n")
-        exit(56)
-    p.lf = p.frameStack[len(p.frameStack)-1]
-    p.frameStack.pop()
-
-def DEFVAR(instruction: Instruction):
-
-    var = Variable(instruction.arguments[0].value)
-    if var.frame == "GF@":
-        p.existedGF(var)
-        p.addGF(var)
-    elif var.frame == "LF@":
-        p.existedLF(var)
-        p.addLF(var)
-    elif var.frame == "TF@":
-        p.existedTF(var)
-        p.addTF(var)
-    else:
-        sys.stderr.write("ERROR: Wrong frame of variable.\n")
-        exit(52)
-
-def CALL(instruction: Instruction):
-    global i
-    p.callStack.append(instruction.line)
-    val = instruction.arguments[0].value
-    for j in p.labels:
-        if j.name == val:
-            i = j.line - 1
-            return
-    exit(52)
-
-def RETURN(instruction: Instruction):
-    global i
-    if len(p.callStack) == 0:
-        sys.stderr.write("ERROR: Call stack is empty.\n")
-        exit(56)
-    i = p.callStack[len(p.callStack)-1]-1
-    p.callStack.pop()
-
-def PUSHS(instruction: Instruction):
-    if instruction.arguments[0].type == "var":
-        var = find(instruction.arguments[0].value)
-        nonDeclared(var)
-        typ = var.type
-        val = var.value
+def nonDeclared(var: Variable):
+    if var.item is None:
+        error("Undeclared variable.", 56)
+
+def checkLabel(program: Program, name: str):
+    if name in program.labels:
+        error("Attempt to redefine label.", 52)
+
+def resolveLabels(program: Program):
+    for instruction in program.instructions:
+        if instruction.name not in branchInst or len(instruction.arguments) == 0:
+            continue
+        line = program.labels.get(instruction.arguments[0].value)
+        if line is None:
+            error("Wrong label.", 52)
+        instruction.target = line
+
+def loadInstruction(inst) -> Instruction:
+    if inst.tag != 'instruction' or inst.get('order') is None:
+        error('Wrong XML - Missing instruction tag or order.', 32)
+    if validInst.get(str(inst.get('opcode')).upper(), {}).get('name') is None:
+        error('Wrong XML -Wrong opcode of instruction.', 32)
+    try: order = int(inst.get('order'))
+    except ValueError:
+        error('Wrong order of instruction.', 32)
+    if order <= 0:
+        error('Wrong order of instruction.', 32)
+
+    instruction = Instruction(inst.get('opcode').upper(), order, 0)     #create an instrction, line is known after ordering
+
+    args = [None, None, None]
+    for argument in inst:
+        slot = argSlots.get(argument.tag)
+        if slot is None or args[slot] is not None:
+            error('Wrong XML - Wrong argument tag.', 32)
+        if argument.get('type') is None:
+            error('Wrong XML - Missing type of argument.', 32)
+        args[slot] = Argument(literal(argument.get('type'), argument.text), argument.get('type'))      #create an argument with decoded value
+
+    for arg in args:
+        if arg is None:
+            break
+        instruction.addArgument(arg)        #add the argument to instruction
+    if len(instruction.arguments) != len(inst):
+        error('Wrong XML - Missing argument.', 32)
+    return instruction
+
+def loadProgram(source) -> Program:
+    import xml.etree.ElementTree as ET     # not needed at all when the program comes from the cache
+    instructions = {}   # order -> Instruction
+    root = None
+    depth = 0
+    # xml load with xml.etree.ElementTree, every instruction is dropped from the tree once it is loaded
+    try:
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            if event == "start":
+                depth = depth + 1
+                if root is None:
+                    root = elem
+                    # xml check
+                    if root.tag != 'program' or str(root.get('language')).upper() != 'IPPCODE23':
+                        error('Wrong XML - Missing program tag or language is not IPPcode23.', 32)
+                continue
+            depth = depth - 1
+            if depth == 1:
+                instruction = loadInstruction(elem)
+                if instruction.order in instructions:
+                    error('Duplicate order of instruction.', 32)
+                instructions[instruction.order] = instruction
+                root.clear()
+    except ET.ParseError:
+        error('XML not well-formed.', 31)
+
+    program = Program()
+    if len(instructions) == 0:
+        return program
+    # place instructions by order, orders may have gaps
+    low = min(instructions)
+    size = max(instructions) - low + 1
+    if size <= 4 * len(instructions):
+        placed = [None] * size
+        for order, instruction in instructions.items():
+            placed[order - low] = instruction
     else:
-        typ = instruction.arguments[0].type
-        val = instruction.arguments[0].value
-
-    item = Item(val, typ)
-    p.dataStack.append(item)
+        placed = [instructions[order] for order in sorted(instructions)]
 
-def POPS(instruction: Instruction):
-    if len(p.dataStack) == 0:
-        sys.stderr.write("ERROR: Data stack is empty.\n")
-        exit(56)
-    
-    item = p.dataStack[len(p.dataStack)-1]
-    p.dataStack.pop()
-    indexWrite(item.value, item.type, instruction.arguments[0].value)
-
-def ADD(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
+    line = 1
+    for instruction in placed:
+        if instruction is None:
+            continue
+        instruction.line = line
+        program.addInstruction(instruction)       #add the instruction with arguments to the program class
+        line = line + 1
+    return program
 
-    if typ1 != 'int' or typ2 != 'int':
-        exit(53)
+# cache of loaded programs - marshal dump of (version, [(name, order, line, ((type, value), ...)), ...])
+def cachePath(directory: str, source) -> str:
+    h = hashlib.sha256(b"IPPcode23 cache %d\n" % cacheVersion)
+    for chunk in iter(lambda: source.read(1 << 16), b""):
+        h.update(chunk)
+    source.seek(0)
+    return os.path.join(directory, h.hexdigest() + ".ippc")
 
+def loadCache(path: str) -> Program:
     try:
-        val1 = int(val1)
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-
-    indexWrite(val1+val2, 'int', instruction.arguments[0].value)
-    
-
-def SUB(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-
-    if typ1 != 'int' or typ2 != 'int':
-        exit(53)
-
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            version, instructions = marshal.loads(m)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    if version != cacheVersion:
+        return None
+    # a damaged or foreign file is a cache miss, the XML is loaded instead
+    program = Program()
     try:
-        val1 = int(val1)
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-
-    indexWrite(val1-val2, 'int', instruction.arguments[0].value)
-
-def MUL(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-
-    if typ1 != 'int' or typ2 != 'int':
-        exit(53)
-
+        for name, order, line, arguments in instructions:
+            if name not in validInst or type(order) is not int or type(line) is not int:
+                return None
+            instruction = Instruction(name, order, line)
+            for typ, val in arguments:
+                if type(val) is not cacheTypes.get(typ):
+                    return None
+                instruction.addArgument(Argument(val, typ))
+            program.addInstruction(instruction)
+    except (ValueError, TypeError):
+        return None     # entries or arguments of a wrong shape
+    return program
+
+def saveCache(program: Program, path: str):
+    instructions = [(ins.name, ins.order, ins.line, tuple((arg.type, arg.value) for arg in ins.arguments)) for ins in program.instructions]
     try:
-        val1 = int(val1)
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-
-    indexWrite(val1*val2, 'int', instruction.arguments[0].value)
-
-def IDIV(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-
-    if typ1 != 'int' or typ2 != 'int':
-        exit(53)
-
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".%d.tmp" % os.getpid()
+        with open(tmp, "wb") as f:
+            marshal.dump((cacheVersion, instructions), f)
+        os.replace(tmp, path)
+    except OSError:
+        sys.stderr.write("WARNING: Can't write cache " + path + ".\n")
+
+def decode(program: Program):
+    for instruction in program.instructions:
+        inst = validInst[instruction.name]
+        if len(instruction.arguments) != inst["argv"]:
+            error('Wrong number of instruction arguments.', 52)
+        checkType(instruction, inst["argv"], inst["arg1"], inst["arg2"], inst["arg3"])
+        instruction.arguments = tuple(instruction.arguments)
+        instruction.index = len(program.code)
+        program.code.append((inst["name"], instruction))
+        for arg in instruction.arguments:
+            if arg.frame == "GF@":
+                arg.slot = program.globalSlots.setdefault(arg.name, len(program.globalSlots))
+
+        if instruction.name == "LABEL":
+            checkLabel(program, instruction.arguments[0].value)
+            program.addLabel(Label(instruction.arguments[0].value, instruction.index + 1))
+
+# optimizer - constant folding, removal of dead code, jump threading and removal of labels from code;
+# instructions keep their order and line, index becomes the one in the new code
+foldInst = ("ADD", "SUB", "MUL", "IDIV", "LT", "GT", "EQ", "AND", "OR", "NOT", "JUMPIFEQ", "JUMPIFNEQ")
+endInst = ("JUMP", "EXIT", "RETURN")    # instructions which never continue with the next one
+
+def foldConstants(code: list, drop: list):
+    # the handler runs on a scratch interpreter, so the result is the same as at run time
+    scratch = Interpreter(Program(), InputReader(text=""), io.StringIO(), io.StringIO())
+    result = Variable("GF@", "result")
+    scratch.addGF(result)
+    dest = Argument("GF@result", "var")
+    for i, (handler, instruction) in enumerate(code):
+        if instruction.name not in foldInst or any(arg.item is None for arg in instruction.arguments[1:]):
+            continue
+        jump = instruction.name in branchInst
+        probe = Instruction(instruction.name, instruction.order, instruction.line)
+        probe.arguments = instruction.arguments if jump else (dest,) + instruction.arguments[1:]
+        probe.target = instruction.target
+        try:
+            nxt = handler(scratch, probe)
+        except InterpretExit:
+            continue    # the error stays for run time
+        if jump and nxt is None:
+            drop[i] = True
+            continue
+        folded = Instruction("JUMP" if jump else "MOVE", instruction.order, instruction.line)
+        folded.arguments = instruction.arguments[:1] if jump else (instruction.arguments[0], Argument(result.item[1], result.item[0]))
+        folded.target = instruction.target
+        code[i] = (validInst[folded.name]["name"], folded)
+
+def removeDead(code: list, drop: list):
+    # repeated while removed jumps make more code unreachable
+    changed = True
+    while changed:
+        changed = False
+        targets = {instruction.target for i, (handler, instruction) in enumerate(code) if instruction.name in branchInst and not drop[i]}
+        live = True
+        for i, (handler, instruction) in enumerate(code):
+            if i in targets:
+                live = True
+            if not live and not drop[i]:
+                drop[i] = changed = True
+            elif live and not drop[i] and instruction.name in endInst:
+                live = False
+
+def follow(code: list, drop: list, index: int) -> int:
+    # index of the first instruction which really runs after a jump to index, chains of jumps are skipped
+    seen = set()
+    while index not in seen:
+        seen.add(index)
+        while index < len(code) and (drop[index] or code[index][1].name == "LABEL"):
+            index += 1
+        if index == len(code) or code[index][1].name != "JUMP":
+            break
+        index = code[index][1].target
+    return index
+
+def optimize(program: Program):
+    code = program.code
+    drop = [False] * len(code)
+    foldConstants(code, drop)
+    for i, (handler, instruction) in enumerate(code):
+        if instruction.name in branchInst and not drop[i]:
+            instruction.target = follow(code, drop, instruction.target)
+    for i, (handler, instruction) in enumerate(code):
+        if instruction.name == "LABEL":
+            drop[i] = True
+    removeDead(code, drop)
+    nxt = len(code)     # the next instruction which stays
+    for i in range(len(code) - 1, -1, -1):
+        if not drop[i] and code[i][1].name == "JUMP" and code[i][1].target == nxt:
+            drop[i] = True  # jump to the next instruction
+        if not drop[i]:
+            nxt = i
+    position = []   # old index -> new index
+    optimized = []
+    for i, item in enumerate(code):
+        position.append(len(optimized))
+        if not drop[i]:
+            optimized.append(item)
+    position.append(len(optimized))
+    for i, (handler, instruction) in enumerate(optimized):
+        instruction.index = i
+        if instruction.name in branchInst:
+            instruction.target = position[instruction.target]
+    for name, line in program.labels.items():
+        program.labels[name] = position[line]
+    program.code = optimized
+
+# superinstructions - pairs of instructions replaced by one handler, the second instruction stays in code
+# for jumps to it and the fused handler continues after the pair
+def fuse(program: Program):
+    code = program.code
+    for i in range(len(code) - 1):
+        first = code[i][1]
+        second = code[i + 1][1]
+        handler = fusedInst.get((first.name, second.name))
+        if handler is None:
+            continue
+        if second.name in ("JUMPIFEQ", "JUMPIFNEQ"):
+            # LT/GT/EQ var ... followed by a jump on var compared with a bool constant
+            test, value = second.arguments[1], second.arguments[2]
+            if test.type != "var" or test.value != first.arguments[0].value or value.type != "bool":
+                continue
+            jumpOn = value.item[1] == (second.name == "JUMPIFEQ")    # result of the comparison which jumps
+            first.target = (i + 2, second.target) if jumpOn else (second.target, i + 2)
+        first.fused = second
+        code[i] = (handler, first)
+
+# type inference - facts about GF variables which hold on every path to an instruction,
+# slot -> type of the value ("int", "bool", "string", "nil", None if the type isn't known, unknown if the variable
+# may be not initialized); a slot in the facts is surely defined, LF and TF variables are never known
+resultType = {"ADD": "int", "SUB": "int", "MUL": "int", "IDIV": "int", "STRLEN": "int", "STRI2INT": "int",
+              "LT": "bool", "GT": "bool", "EQ": "bool", "AND": "bool", "OR": "bool", "NOT": "bool",
+              "CONCAT": "string", "INT2CHAR": "string", "GETCHAR": "string", "SETCHAR": "string", "TYPE": "string",
+              "READ": None, "POPS": None, "MOVE": None}     # instructions which write to their first operand
+unknown = "?"   # type of a defined variable which may be not initialized
+
+def typeOf(arg: Argument, facts: dict):
+    # type of the operand if it is surely initialized and known, None otherwise
+    if arg.type != "var":
+        return arg.type
+    if arg.slot is None:
+        return None
+    typ = facts.get(arg.slot)
+    return None if typ == unknown else typ
+
+def flow(facts: dict, instruction: Instruction):
+    name = instruction.name
+    if name == "DEFVAR":
+        if instruction.arguments[0].slot is not None:
+            facts[instruction.arguments[0].slot] = unknown
+    elif name in resultType and instruction.arguments[0].slot is not None:
+        typ = typeOf(instruction.arguments[1], facts) if name == "MOVE" else resultType[name]
+        facts[instruction.arguments[0].slot] = typ     # the write defines and initializes the variable
+
+def meet(facts: dict, other: dict) -> dict:
+    return {slot: typ if other[slot] == typ else (unknown if unknown in (typ, other[slot]) else None)
+            for slot, typ in facts.items() if slot in other}
+
+def inferTypes(program: Program) -> dict:
+    # facts at the start of each reachable block
+    code = program.code
+    entry = {0: {}} if program.blocks else {}
+    work = [0] if program.blocks else []
+    while work:
+        block = program.blockAt[work.pop()]
+        facts = dict(entry[block.start])
+        for handler, instruction in code[block.start:block.stop]:
+            flow(facts, instruction)
+        last = code[block.stop - 1][1]
+        for successor in block.successors:
+            if successor == len(code):
+                continue
+            out = facts
+            if last.name == "CALL" and successor == block.stop:
+                # the function may change the types, but not undefine or uninitialize variables
+                out = {slot: (unknown if typ == unknown else None) for slot, typ in facts.items()}
+            new = out if successor not in entry else meet(entry[successor], out)
+            if entry.get(successor) != new:
+                entry[successor] = new
+                work.append(successor)
+    return entry
+
+def specializable(instruction: Instruction, facts: dict) -> bool:
+    name = instruction.name
+    args = instruction.arguments
+    if name in fastInst and name not in branchInst:
+        if args[0].slot not in facts:
+            return False    # the destination may be not defined
+    types = [typeOf(arg, facts) for arg in args[1:]]
+    if None in types:
+        return False
+    if name in ("ADD", "SUB", "MUL", "IDIV"):
+        return types == ["int", "int"]
+    if name in ("AND", "OR", "NOT"):
+        return all(typ == "bool" for typ in types)
+    if name == "STRLEN":
+        return types == ["string"]
+    if name in ("LT", "GT"):
+        return types[0] == types[1] != "nil"
+    if name in ("EQ", "JUMPIFEQ", "JUMPIFNEQ"):
+        return types[0] == types[1]
+    return name == "MOVE"
+
+def specialize(program: Program):
+    # selects check-free handlers where the facts prove the checks pass
+    entry = inferTypes(program)
+    count = 0
+    for start, facts in entry.items():
+        for i in range(start, program.blockAt[start].stop):
+            handler, instruction = program.code[i]
+            if instruction.name in fastInst and handler is validInst[instruction.name]["name"] and specializable(instruction, facts):
+                program.code[i] = (fastInst[instruction.name], instruction)
+                count += 1
+            flow(facts, instruction)
+    program.specialized = count
+
+# control flow graph - basic blocks start at 0, at jump targets and after jumps, CALL, EXIT and RETURN
+def leaders(code: list) -> list:
+    starts = {0}
+    for i, (handler, instruction) in enumerate(code):
+        if instruction.name in branchInst:
+            starts.add(instruction.target)
+        if instruction.name in branchInst or instruction.name in endInst:
+            starts.add(i + 1)   # also the return address of CALL
+    return sorted(start for start in starts if start < len(code))
+
+def buildBlocks(program: Program):
+    code = program.code
+    starts = leaders(code)
+    program.blocks = []
+    program.blockAt = [None] * len(code)
+    for n, start in enumerate(starts):
+        block = Block(start, starts[n + 1] if n + 1 < len(starts) else len(code))
+        steps = []
+        i = start
+        while i < block.stop:
+            handler, instruction = code[i]
+            if instruction.fused is not None and i + 1 == block.stop:
+                handler = validInst[instruction.name]["name"]   # the second instruction of the pair is in the next block
+            steps.append((handler, instruction))
+            i += 1 if instruction.fused is None else 2
+        block.body = steps[:-1]
+        block.last = steps[-1]
+        last = code[block.stop - 1][1]
+        if last.name in branchInst:
+            block.successors.append(last.target)
+        if last.name not in ("JUMP", "EXIT", "RETURN"):
+            block.successors.append(block.stop)     # no jump, or the return from CALL
+        program.blocks.append(block)
+        program.blockAt[start] = block
+    for block in program.blocks:
+        for successor in block.successors:
+            if successor < len(code):
+                program.blockAt[successor].predecessors.append(block.start)
+
+def dumpBlocks(program: Program, path: str):
+    lines = []
+    for block in program.blocks:
+        lines.append("block %d-%d  <- %s  -> %s" % (block.start, block.stop - 1,
+                     ", ".join(map(str, block.predecessors)) or "-", ", ".join(map(str, block.successors)) or "-"))
+        for handler, instruction in program.code[block.start:block.stop]:
+            lines.append("    %-6d %-12s %s" % (instruction.order, instruction.name,
+                         " ".join(str(arg.value) if arg.type in ("var", "label", "type") else
+                                  arg.type + "@" + (escape(arg.value) if arg.type == "string" else toStr(arg.type, arg.value))
+                                  for arg in instruction.arguments)))
+            if handler is not validInst[instruction.name]["name"]:
+                lines[-1] += "  [" + handler.__name__ + "]"    # fused or check-free handler
     try:
-        val1 = int(val1)
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-
-    if val2 == 0:
-        sys.stderr.write("ERROR: Can't divide with zero.\n")
-        exit(57)
-
-    indexWrite(val1//val2, 'int', instruction.arguments[0].value)
-
-def LT(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        val2 = var2.value
+        with open(path, mode = "w") as f:
+            f.write("\n".join(lines) + "\n")
+    except OSError:
+        error("Can't write " + path + " file.", 12)
+
+# ahead-of-time translation - every basic block of the CFG becomes a Python function which runs its instructions
+# and returns the index of the next one; hot instructions are written out inline, the others call their handler
+blockSize = 200     # longest block, longer ones are split so that the generated functions stay small
+frameNames = {"LF@": ("lf", "Local frame isn't existed."), "TF@": ("tf", "Temporary frame isn't existed.")}
+
+def emitFind(lines: list, arg: Argument):
+    # v = Variable of the operand
+    if arg.slot is not None:
+        lines.append("    v = G[%d]" % arg.slot)
+        lines.append("    if v is undefined: error('Variable was not defined.', 54)")
+        return
+    if arg.frame not in frameNames:
+        lines.append("    error('Wrong frame of variable.', 52)")
+        return
+    attr, message = frameNames[arg.frame]
+    lines.append("    f = it.%s" % attr)
+    lines.append("    if f is None: error(%r, 55)" % message)
+    lines.append("    v = f.vars.get(%r)" % arg.name)
+    lines.append("    if v is None: error('Variable was not defined.', 54)")
+
+def emitRead(lines: list, arg: Argument, item: str) -> tuple:
+    # returns the expressions of type and value of the operand
+    if arg.type != "var":
+        return repr(arg.type), repr(arg.item[1])
+    emitFind(lines, arg)
+    lines.append("    %s = v.item" % item)
+    lines.append("    if %s is None: error('Undeclared variable.', 56)" % item)
+    return item + "[0]", item + "[1]"
+
+def emitCheck(lines: list, checks: list):
+    # checks - (type expression, allowed type), constants are checked now
+    tests = ["%s != %r" % (typ, allowed) for typ, allowed in checks if not typ.startswith("'")]
+    if any(typ.startswith("'") and typ != repr(allowed) for typ, allowed in checks):
+        lines.append("    error('Wrong type of operand.', 53)")
+    elif tests:
+        lines.append("    if %s: error('Wrong type of operand.', 53)" % " or ".join(tests))
+
+def emitInstruction(lines: list, k: int, instruction: Instruction) -> bool:
+    # returns True if the instruction always leaves the block
+    name = instruction.name
+    args = instruction.arguments
+    if name in ("ADD", "SUB", "MUL", "IDIV", "LT", "GT", "EQ", "AND", "OR", "JUMPIFEQ", "JUMPIFNEQ"):
+        typ1, val1 = emitRead(lines, args[1], "x1")
+        typ2, val2 = emitRead(lines, args[2], "x2")
+        if name in ("ADD", "SUB", "MUL", "IDIV"):
+            emitCheck(lines, [(typ1, "int"), (typ2, "int")])
+            if name == "IDIV":
+                lines.append("    if %s == 0: error(\"Can't divide with zero.\", 57)" % val2)
+            result = "('int', %s %s %s)" % (val1, {"ADD": "+", "SUB": "-", "MUL": "*", "IDIV": "//"}[name], val2)
+        elif name in ("AND", "OR"):
+            emitCheck(lines, [(typ1, "bool"), (typ2, "bool")])
+            result = "TRUE if %s %s %s else FALSE" % (val1, name.lower(), val2)
+        elif name in ("LT", "GT"):
+            lines.append("    if %s != %s or %s == 'nil': error('Wrong type of operand.', 53)" % (typ1, typ2, typ1))
+            result = "TRUE if %s %s %s else FALSE" % (val1, "<" if name == "LT" else ">", val2)
+        else:
+            result = "equal(%s, %s, %s, %s)" % (typ1, val1, typ2, val2)
+            if name != "EQ":
+                lines.append("    if %s%s: return %d" % ("" if name == "JUMPIFEQ" else "not ", result, instruction.target))
+                return False
+            lines.append("    x3 = TRUE if %s else FALSE" % result)     # type errors of equal() before the destination
+            result = "x3"
+        emitFind(lines, args[0])
+        lines.append("    v.item = " + result)
+    elif name in ("MOVE", "NOT", "PUSHS", "WRITE"):
+        src = args[0] if name in ("PUSHS", "WRITE") else args[1]
+        typ, val = emitRead(lines, src, "x1")
+        if name == "NOT":
+            emitCheck(lines, [(typ, "bool")])
+            emitFind(lines, args[0])
+            lines.append("    v.item = FALSE if %s else TRUE" % val)
+            return False
+        if name == "WRITE":
+            lines.append("    it.out.write(toStr(%s, %s))" % (typ, val))
+            return False
+        item = "x1" if src.type == "var" else repr(src.item)
+        if src.type == "var":
+            lines.append("    if type(x1[1]) is Rope: x1[1].owner = None")
+        if name == "PUSHS":
+            lines.append("    it.dataStack.append(%s)" % item)
+        else:
+            emitFind(lines, args[0])
+            lines.append("    v.item = " + item)
+    elif name == "POPS":
+        lines.append("    if len(it.dataStack) == 0: error('Data stack is empty.', 56)")
+        lines.append("    x1 = it.dataStack.pop()")
+        emitFind(lines, args[0])
+        lines.append("    v.item = x1")
+    elif name == "JUMP":
+        lines.append("    return %d" % instruction.target)
+        return True
+    elif name == "CALL":
+        lines.append("    it.callStack.append(%d)" % (instruction.index + 1))
+        lines.append("    return %d" % instruction.target)
+        return True
+    elif name == "RETURN":
+        lines.append("    if len(it.callStack) == 0: error('Call stack is empty.', 56)")
+        lines.append("    return it.callStack.pop()")
+        return True
     else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-    
-    if(typ1 == "nil" or typ2 == "nil"):
-        sys.stderr.write("ERROR: Wrong type - nil.\n")
-        exit(53)
-
-    if typ1 != typ2:
-        exit(53)
+        lines.append("    it.%s(I[%d])" % (name, k))
+    return False
+
+def translate(program: Program) -> list:
+    # returns the block function for each index where a block starts, None if the program can't be translated
+    code = program.code
+    starts = [start for block in program.blocks for start in range(block.start, block.stop, blockSize)]
+    lines = []
+    for n, start in enumerate(starts):
+        stop = starts[n + 1] if n + 1 < len(starts) else len(code)
+        lines.append("def b%d(it):" % start)
+        lines.append("    G = it.globals")
+        for k in range(start, stop):
+            if emitInstruction(lines, k, code[k][1]):
+                break
+        else:
+            lines.append("    return %d" % stop)
+    namespace = {"error": error, "equal": equal, "undefined": undefined, "toStr": toStr, "Rope": Rope, "TRUE": TRUE, "FALSE": FALSE,
+                 "I": [instruction for handler, instruction in code]}
+    try:
+        exec(compile("\n".join(lines) + "\n", "<ippcode23>", "exec"), namespace)
+    except (SyntaxError, RecursionError, MemoryError, ValueError):
+        return None     # the interpreter runs the program
+    blocks = [None] * len(code)
+    for start in starts:
+        blocks[start] = namespace["b%d" % start]
+    return blocks
 
-    if typ1 == "bool":
-        if val1 == "false" and val2 == "true":
-            indexWrite("true", "bool", instruction.arguments[0].value)
-            return
-        else:  
-            indexWrite("false", "bool", instruction.arguments[0].value)
-            return
+def checkType(instruction: Instruction, num: int, arg1, arg2, arg3):
+    
+    if arg1 is None:
+        return
+    if instruction.arguments[0].type not in arg1:
+            error("Wrong type of instruction argument.", 53)
+    if arg2 is None:
+        return
+    if instruction.arguments[1].type not in arg2:
+            error("Wrong type of instruction argument.", 53)
+    if arg3 is None:
+        return
+    if instruction.arguments[2].type not in arg3:
+            error("Wrong type of instruction argument.", 53)
+
+class Rope:
+    __slots__ = ("parts", "count", "length", "chars", "flat", "owner")
+    def __init__(self, parts: list, count: int, length: int, chars=False):
+        self.parts = parts  # pieces of the string, the list is shared with ropes made by appending to this one
+        self.count = count  # number of pieces of this rope
+        self.length = length
+        self.chars = chars  # every piece is a single character, so pieces can be indexed and replaced
+        self.flat = None    # joined string
+        self.owner = None   # Variable which may change the rope in place, None when the rope is shared
+    def __len__(self):
+        return self.length
+    def __str__(self):
+        if self.flat is None:
+            self.flat = "".join(self.parts if self.count == len(self.parts) else self.parts[:self.count])
+            if not self.chars:
+                self.parts = [self.flat]
+                self.count = 1
+        return self.flat
+    def __getitem__(self, index: int) -> str:
+        if not self.chars:
+            self.parts = list(str(self))
+            self.count = self.length
+            self.chars = True
+        return self.parts[index]
+    def __add__(self, other):
+        other = str(other)
+        self.owner = None
+        parts = self.parts
+        if len(parts) != self.count:    # the list is used by a longer rope already
+            parts = parts[:self.count]
+        if self.chars:
+            parts.extend(other)
+        else:
+            parts.append(other)
+        return Rope(parts, len(parts), self.length + len(other), self.chars)
+    def __radd__(self, other):
+        return Rope([str(other), str(self)], 2, len(other) + self.length)
+    def __eq__(self, other):
+        return str(self) == str(other)
+    def __lt__(self, other):
+        return str(self) < str(other)
+    def __gt__(self, other):
+        return str(self) > str(other)
+    def __hash__(self):
+        return hash(str(self))
+    def setChar(self, index: int, char: str):
+        self.parts[index] = char
+        self.flat = None
+
+def concat(val1, val2):
+    if type(val1) is not Rope:
+        if len(val1) + len(val2) < ropeSize:
+            return val1 + val2
+        val1 = Rope([val1], 1, len(val1))
+    return val1 + val2
+
+def share(item: tuple) -> tuple:
+    if type(item[1]) is Rope:
+        item[1].owner = None    # the value gets another holder, SETCHAR has to copy it from now
+    return item
+
+class OutputBuffer:
+    __slots__ = ("stream", "parts", "size", "limit")
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.parts = []
+        self.size = 0   # characters waiting in parts
+        self.limit = limit
+    def write(self, text: str):
+        self.parts.append(text)
+        self.size = self.size + len(text)
+        if self.size >= self.limit:
+            self.flush()
+    def flush(self):
+        if self.parts:
+            self.stream.write("".join(self.parts))
+            self.parts = []
+            self.size = 0
+        self.stream.flush()
+
+class InputReader:
+    __slots__ = ("stream", "bulk", "lines", "pos", "rest")
+    def __init__(self, stream=None, text=None):
+        self.stream = stream    # None when the whole input is preloaded in text
+        self.bulk = not (stream is not None and hasattr(stream, "isatty") and stream.isatty())  # terminal is read by lines
+        self.lines = []
+        self.pos = 0
+        self.rest = ""  # unfinished line from the last chunk
+        if text is not None:
+            self.lines = text.split("\n")
+            if self.lines[-1] == "":
+                self.lines.pop()
+    def readline(self):
+        if self.pos == len(self.lines) and not self.fill():
+            return None     # EOF
+        line = self.lines[self.pos]
+        self.pos = self.pos + 1
+        return line
+    def fill(self) -> bool:
+        while self.stream is not None:
+            chunk = self.stream.read(inputChunkSize) if self.bulk else self.stream.readline()
+            if chunk == "":
+                self.stream = None
+                if self.rest == "":
+                    return False
+                self.lines = [self.rest]
+            else:
+                self.lines = (self.rest + chunk).split("\n")
+                self.rest = self.lines.pop()
+                if len(self.lines) == 0:
+                    continue
+            self.pos = 0
+            return True
+        return False
+
+class Interpreter:
+    __slots__ = ("program", "stdin", "input", "stdout", "stderr", "out", "maxSteps", "timeout", "maxStack", "maxString",
+                 "profile", "stats", "gf", "globals", "lf", "tf", "frameStack", "callStack", "dataStack", "pc", "blockAt",
+                 "code", "warm", "quickened", "deoptimized", "counts", "times", "loops", "peakVars", "peakData",
+                 "peakFrames", "peakCalls")
+    def __init__(self, program: Program, stdin=None, stdout=None, stderr=None, maxSteps=None, timeout=None, bufferSize=None, profile=None, stats=None,
+                 maxStack=None, maxString=None):
+        self.program = program
+        self.stdin = sys.stdin if stdin is None else stdin
+        self.input = self.stdin if isinstance(self.stdin, InputReader) else InputReader(self.stdin)
+        self.stdout = sys.stdout if stdout is None else stdout
+        self.stderr = sys.stderr if stderr is None else stderr
+        self.out = OutputBuffer(self.stdout, outputBufferSize if bufferSize is None else bufferSize)
+        self.maxSteps = maxSteps
+        self.timeout = timeout
+        self.maxStack = maxStack    # the most items in each of data, frame and call stacks
+        self.maxString = sys.maxsize if maxString is None else maxString    # the longest string
+        self.profile = profile  # file for the profile report, None runs without profiling
+        self.stats = stats  # file for the run statistics, None runs without them
+        self.reset()
+
+    def reset(self):
+        self.gf = Frame() # global frame
+        self.globals = [undefined] * len(self.program.globalSlots)  # Variables of the global frame by slot
+        self.lf = None  # local frame
+        self.tf = None  # temporary frame
+        self.frameStack = []    # stack for frames
+        self.callStack = [] # stack for calls
+        self.dataStack = [] # stack for data
+        self.pc = 0     # index of the executed instruction
+        self.blockAt = [None if block is None else block.copy() for block in self.program.blockAt]  # blocks of this run
+        if self.stats is not None:
+            trackBlocks(self.blockAt, self.program.code)
+        self.code = None    # copy of code run by executeProfiled
+        self.warm = {}  # ADAPTIVE instruction -> runs with the same operand types, negative with other types
+        self.quickened = 0  # instructions rewritten to _QUICK handlers
+        self.deoptimized = 0    # _QUICK handlers whose guard failed
+        self.counts = None  # profile - executions of each instruction
+        self.times = None   # profile - nanoseconds spent in each instruction
+        self.loops = None   # profile - (index of label, index of jump) -> jumps back
+        self.peakVars = 0   # stats - most defined variables in GF, LF and TF after DEFVAR and POPFRAME
+        self.peakData = 0   # stats - deepest stacks
+        self.peakFrames = 0
+        self.peakCalls = 0
+
+    def run(self) -> int:
+        self.reset()
+        try:
+            if self.profile is not None:
+                self.executeProfiled()
+            elif self.stats is not None or self.maxSteps is not None or self.timeout is not None or self.maxStack is not None:
+                self.executeLimited()
+            elif self.program.native is not None:
+                self.executeNative()
+            else:
+                self.execute()
+        except InterpretExit as e:
+            self.out.flush()
+            if e.message is not None:
+                self.stderr.write("ERROR: " + e.message + "\n")
+            return e.code
+        finally:
+            self.out.flush()
+        return 0
+
+    # runs whole basic blocks, only the last instruction of a block can jump
+    def execute(self):
+        blockAt = self.blockAt
+        i = self.pc
+        end = len(blockAt)
 
-    if typ1 == "int" and typ2 == "int":
         try:
-            val1 = int(val1)
-            val2 = int(val2)
-        except:
-            sys.stderr.write("ERROR: Wrong value of int.\n")
-            exit(32)
-    if val1<val2:
-        indexWrite("true", "bool", instruction.arguments[0].value)
-    else:
-        indexWrite("false", "bool", instruction.arguments[0].value)
-
-def GT(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-    
-    if(typ1 == "nil" or typ2 == "nil"):
-        sys.stderr.write("ERROR: Wrong type - nil.\n")
-        exit(53)
+            while i < end:
+                block = blockAt[i]
+                for handler, instruction in block.body:
+                    handler(self, instruction)
+                handler, instruction = block.last
+                nxt = handler(self, instruction)     # index of next instruction if the handler jumps
+                i = block.stop if nxt is None else nxt
+        finally:
+            self.pc = i
+
+    # whole blocks like execute, steps are counted by instructions in code, so a fused pair counts as two;
+    # also --stats without --profile - runs of blocks are counted, counts of instructions are computed from them
+    def executeLimited(self):
+        blockAt = self.blockAt
+        i = self.pc
+        end = len(blockAt)
+        runs = [0] * end    # complete runs of the block starting at the index
+        steps = 0
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        check = 0   # limits are checked only every checkInterval steps, before a block
+        instruction = None  # the last instruction which ran, it ended the program if that stopped inside a block
 
-    if typ1 != typ2:
-        exit(53)
+        try:
+            while i < end:
+                block = blockAt[i]
+                size = block.stop - i
+                if steps + size > check:
+                    instruction = None
+                    check = self.checkLimits(steps, deadline)
+                    if self.maxSteps is not None and steps + size > self.maxSteps:
+                        # the block would cross the limit, its instructions up to the limit run one by one
+                        for handler, instruction in unfusedCode(self.program.code[i:i + self.maxSteps - steps], self.stats is not None):
+                            handler(self, instruction)
+                        error("Instruction limit exceeded.", limitExit)
+                for handler, instruction in block.body:
+                    handler(self, instruction)
+                handler, instruction = block.last
+                nxt = handler(self, instruction)     # index of next instruction if the handler jumps
+                runs[i] += 1
+                i = block.stop if nxt is None else nxt
+                steps = steps + size
+        finally:
+            self.pc = i
+            if self.stats is not None:
+                self.counts = blockCounts(blockAt, runs, instruction if i < end else None)
+
+    # translated program - each call runs a whole block
+    def executeNative(self):
+        blocks = self.program.native
+        i = self.pc
+        end = len(blocks)
 
-    if typ1 == "bool":
-        if val1 == "true" and val2 == "false":
-            indexWrite("true", "bool", instruction.arguments[0].value)
-            return
-        else:  
-            indexWrite("false", "bool", instruction.arguments[0].value)
-            return
+        try:
+            while i < end:
+                i = blocks[i](self)
+        finally:
+            self.pc = i
+
+    # returns the step of the next check, stacks can outgrow the limit by checkInterval items and a block at most
+    def checkLimits(self, steps: int, deadline) -> int:
+        if self.maxSteps is not None and steps >= self.maxSteps:
+            error("Instruction limit exceeded.", limitExit)
+        if deadline is not None and time.perf_counter() > deadline:
+            error("Time limit exceeded.", limitExit)
+        if self.maxStack is not None and max(len(self.dataStack), len(self.frameStack), len(self.callStack)) > self.maxStack:
+            error("Stack limit exceeded.", limitExit)
+        check = steps + checkInterval
+        if self.maxSteps is not None and check > self.maxSteps:
+            check = self.maxSteps
+        return check
+
+    # stats variants of handlers, used only in the blocks of --stats runs and in the code of executeProfiled
+    # defined, not only initialized variables - writes to variables run in check-free and fused handlers, which stay
+    def trackVars(self):
+        count = len(self.gf) + (0 if self.lf is None else len(self.lf)) + (0 if self.tf is None else len(self.tf))
+        if count > self.peakVars:
+            self.peakVars = count
+
+    def trackDEFVAR(self, instruction: Instruction):
+        self.DEFVAR(instruction)
+        self.trackVars()
+
+    def trackPOPFRAME(self, instruction: Instruction):
+        # the LF from the frame stack comes back next to the popped frame, now TF
+        self.POPFRAME(instruction)
+        self.trackVars()
+
+    def trackPUSHS(self, instruction: Instruction):
+        self.PUSHS(instruction)
+        if len(self.dataStack) > self.peakData:
+            self.peakData = len(self.dataStack)
+
+    def trackPUSHFRAME(self, instruction: Instruction):
+        self.PUSHFRAME(instruction)
+        if len(self.frameStack) > self.peakFrames:
+            self.peakFrames = len(self.frameStack)
+
+    def trackCALL(self, instruction: Instruction):
+        nxt = self.CALL(instruction)
+        if len(self.callStack) > self.peakCalls:
+            self.peakCalls = len(self.callStack)
+        return nxt
+
+    # separate loop, so that the other loops pay nothing for profiling; the code is unfused, every instruction gets its own count
+    def executeProfiled(self):
+        self.code = code = unfusedCode(self.program.code, self.stats is not None)
+        i = self.pc
+        end = len(code)
+        self.counts = counts = [0] * end
+        self.times = times = [0] * end
+        self.loops = loops = {}
+        clock = time.perf_counter_ns
+        steps = 0
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+        check = 0
 
-    if typ1 == "int" and typ2 == "int":
         try:
-            val1 = int(val1)
-            val2 = int(val2)
-        except:
-            sys.stderr.write("ERROR: Wrong value of int.\n")
-            exit(32)
-    if val1>val2:
-        indexWrite("true", "bool", instruction.arguments[0].value)
-    else:
-        indexWrite("false", "bool", instruction.arguments[0].value)
-
-def EQ(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-        
-    if typ1 == 'nil' or typ2 == 'nil':
-        if typ1 == typ2:
-            indexWrite("true", "bool", instruction.arguments[0].value)
-            return
+            while i < end:
+                if steps >= check:
+                    check = self.checkLimits(steps, deadline)
+                handler, instruction = code[i]
+                counts[i] += 1
+                start = clock()
+                nxt = handler(self, instruction)
+                times[i] += clock() - start
+                if nxt is None:
+                    i += 1
+                else:
+                    if nxt <= i and instruction.name != "RETURN":   # jump back to a label closes a loop
+                        loops[nxt, i] = loops.get((nxt, i), 0) + 1
+                    i = nxt
+                steps = steps + 1
+        finally:
+            self.pc = i
+
+    # fused handlers, see fuse()
+    def PUSHS_POPS(self, instruction: Instruction):
+        self.indexWrite(share(self.symb(instruction.arguments[0])), instruction.fused.arguments[0])
+        return instruction.index + 2
+
+    def DEFVAR_MOVE(self, instruction: Instruction):
+        self.DEFVAR(instruction)
+        self.MOVE(instruction.fused)
+        return instruction.index + 2
+
+    def LT_JUMP(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != typ2 or typ1 == "nil":
+            error("Wrong type of operand.", 53)
+        result = val1 < val2
+        self.indexWrite(TRUE if result else FALSE, instruction.arguments[0])
+        return instruction.target[result]
+
+    def GT_JUMP(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != typ2 or typ1 == "nil":
+            error("Wrong type of operand.", 53)
+        result = val1 > val2
+        self.indexWrite(TRUE if result else FALSE, instruction.arguments[0])
+        return instruction.target[result]
+
+    def EQ_JUMP(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        result = equal(typ1, val1, typ2, val2)
+        self.indexWrite(TRUE if result else FALSE, instruction.arguments[0])
+        return instruction.target[result]
+
+    # quickening - ADAPTIVE watches the operand types of LT, GT, EQ, JUMPIFEQ, JUMPIFNEQ (also fused with a jump)
+    # and after quickenAfter runs with the same int or string types rewrites the instruction to its _QUICK handler;
+    # a _QUICK handler guards the types and goes back to the generic handler for good when the guard fails;
+    # the rewrites change only the blocks and code of this run, the Program stays as compiled
+    def ADAPTIVE(self, instruction: Instruction):
+        glob = self.globals
+        op1, op2 = instruction.arguments[1], instruction.arguments[2]
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        runs = self.warm.get(instruction, 0)
+        if x1 is not None and x2 is not None and x1[0] == x2[0] and x1[0] in ("int", "string"):
+            runs = max(runs, 0) + 1
+            if runs >= quickenAfter:
+                self.rewrite(instruction, Interpreter.ADAPTIVE, quickInst[instruction.quick])
+                self.quickened += 1
         else:
-            indexWrite("false", "bool", instruction.arguments[0].value)
-            return
-
-    if typ1 == typ2:
-        if typ1 == 'int':
-            try:
-                val1 = int(val1)
-                val2 = int(val2)
-            except:
-                sys.stderr.write("ERROR: Wrong value of int.\n")
-                exit(32)
-        if typ1 == 'string':
-            try:
-                val1 = str(val1)
-                val2 = str(val2)
-            except:
-                sys.stderr.write("ERROR: Wrong value of string.\n")
-                exit(32)
+            runs = min(runs, 0) - 1     # negative - runs with other types
+            if runs <= -quickenAfter:
+                self.rewrite(instruction, Interpreter.ADAPTIVE, instruction.quick)  # the types don't suit a _QUICK handler
+        self.warm[instruction] = runs
+        return instruction.quick(self, instruction)
+
+    def deopt(self, instruction: Instruction, handler):
+        self.rewrite(instruction, handler, instruction.quick)
+        self.deoptimized += 1
+        return instruction.quick(self, instruction)
+
+    def rewrite(self, instruction: Instruction, old, new):
+        # replaces the handler of the instruction in the code and blocks of this run
+        i = instruction.index
+        if self.code is not None and self.code[i] == (old, instruction):
+            self.code[i] = (new, instruction)
+        while self.blockAt[i] is None:
+            i -= 1
+        block = self.blockAt[i]
+        if block.last == (old, instruction):
+            block.last = (new, instruction)
+        for k, step in enumerate(block.body):
+            if step == (old, instruction):
+                block.body[k] = (new, instruction)
+
+    def LT_QUICK(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.LT_QUICK)
+        self.indexWrite(TRUE if x1[1] < x2[1] else FALSE, dest)
+
+    def GT_QUICK(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.GT_QUICK)
+        self.indexWrite(TRUE if x1[1] > x2[1] else FALSE, dest)
+
+    def EQ_QUICK(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.EQ_QUICK)
+        self.indexWrite(TRUE if x1[1] == x2[1] else FALSE, dest)
+
+    def JUMPIFEQ_QUICK(self, instruction: Instruction):
+        label, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.JUMPIFEQ_QUICK)
+        if x1[1] == x2[1]:
+            return instruction.target
+
+    def JUMPIFNEQ_QUICK(self, instruction: Instruction):
+        label, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.JUMPIFNEQ_QUICK)
+        if x1[1] != x2[1]:
+            return instruction.target
+
+    def LT_JUMP_QUICK(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.LT_JUMP_QUICK)
+        result = x1[1] < x2[1]
+        self.indexWrite(TRUE if result else FALSE, dest)
+        return instruction.target[result]
+
+    def GT_JUMP_QUICK(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.GT_JUMP_QUICK)
+        result = x1[1] > x2[1]
+        self.indexWrite(TRUE if result else FALSE, dest)
+        return instruction.target[result]
+
+    def EQ_JUMP_QUICK(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        x1 = op1.item or glob[op1.slot].item
+        x2 = op2.item or glob[op2.slot].item
+        if x1 is None or x2 is None or x1[0] != x2[0] or x1[0] == "nil":
+            return self.deopt(instruction, Interpreter.EQ_JUMP_QUICK)
+        result = x1[1] == x2[1]
+        self.indexWrite(TRUE if result else FALSE, dest)
+        return instruction.target[result]
+
+    # check-free handlers, see specialize() - GF variables are defined and initialized with the right type
+    def MOVE_FAST(self, instruction: Instruction):
+        dest, src = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = share(src.item or glob[src.slot].item)
+
+    def ADD_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = ("int", (op1.item or glob[op1.slot].item)[1] + (op2.item or glob[op2.slot].item)[1])
+
+    def SUB_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = ("int", (op1.item or glob[op1.slot].item)[1] - (op2.item or glob[op2.slot].item)[1])
+
+    def MUL_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = ("int", (op1.item or glob[op1.slot].item)[1] * (op2.item or glob[op2.slot].item)[1])
+
+    def IDIV_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        val2 = (op2.item or glob[op2.slot].item)[1]
+        if val2 == 0:
+            error("Can't divide with zero.", 57)
+        glob[dest.slot].item = ("int", (op1.item or glob[op1.slot].item)[1] // val2)
+
+    def LT_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = TRUE if (op1.item or glob[op1.slot].item)[1] < (op2.item or glob[op2.slot].item)[1] else FALSE
+
+    def GT_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = TRUE if (op1.item or glob[op1.slot].item)[1] > (op2.item or glob[op2.slot].item)[1] else FALSE
+
+    def EQ_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = TRUE if (op1.item or glob[op1.slot].item)[1] == (op2.item or glob[op2.slot].item)[1] else FALSE
+
+    def AND_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = TRUE if (op1.item or glob[op1.slot].item)[1] and (op2.item or glob[op2.slot].item)[1] else FALSE
+
+    def OR_FAST(self, instruction: Instruction):
+        dest, op1, op2 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = TRUE if (op1.item or glob[op1.slot].item)[1] or (op2.item or glob[op2.slot].item)[1] else FALSE
+
+    def NOT_FAST(self, instruction: Instruction):
+        dest, op1 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = FALSE if (op1.item or glob[op1.slot].item)[1] else TRUE
+
+    def STRLEN_FAST(self, instruction: Instruction):
+        dest, op1 = instruction.arguments
+        glob = self.globals
+        glob[dest.slot].item = ("int", len((op1.item or glob[op1.slot].item)[1]))
+
+    def JUMPIFEQ_FAST(self, instruction: Instruction):
+        label, op1, op2 = instruction.arguments
+        glob = self.globals
+        if (op1.item or glob[op1.slot].item)[1] == (op2.item or glob[op2.slot].item)[1]:
+            return instruction.target
+
+    def JUMPIFNEQ_FAST(self, instruction: Instruction):
+        label, op1, op2 = instruction.arguments
+        glob = self.globals
+        if (op1.item or glob[op1.slot].item)[1] != (op2.item or glob[op2.slot].item)[1]:
+            return instruction.target
 
-    else:
-        exit(53)
+    #global frame
+    def addGF(self, var: Variable):
+        self.gf.add(var)
+    def existedGF(self, var: Variable):
+        if var.getName() in self.gf:
+            error("Attempt to redefine variable.", 52)
 
-    if val1 == val2:
-        indexWrite("true", "bool", instruction.arguments[0].value)
-    else:
-        indexWrite("false", "bool", instruction.arguments[0].value)
+    #local frame
+    def initLF(self):
+        self.lf = Frame()
+    def addLF(self, var: Variable):
+        if self.lf is None:
+            error("Local rame doesn't exist.", 55)
+        self.lf.add(var)
+    def existedLF(self, var: Variable):
+        if self.lf is None:
+            error("Local rame doesn't exist.", 55)
+        if var.getName() in self.lf:
+            error("Attempt to redefine variable.", 52)
 
-def AND(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "bool":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "bool":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
+    #temporary frame
+    def initTF(self):
+        self.tf = Frame()
+    def addTF(self, var: Variable):
+        if self.tf is None:
+            error("Temporary frame doesn't exist.", 55)
+        self.tf.add(var)
+    def existedTF(self, var: Variable):
+        if self.tf is None:
+            error("Temporary frame doesn't exist.", 55)
+        if var.getName() in self.tf:
+            error("Attempt to redefine variable.", 52)
+
+    def frameOf(self, frame: str) -> Frame:
+        if frame == "GF@":
+            return self.gf
+        if frame == "LF@":
+            if self.lf is None:
+                error("Local frame isn't existed.", 55)
+            return self.lf
+        if frame == "TF@":
+            if self.tf is None:
+                error("Temporary frame isn't existed.", 55)
+            return self.tf
+        error("Wrong frame of variable.", 52)
+
+    def find(self, arg: Argument) -> Variable:
+        if arg.slot is not None:
+            v = self.globals[arg.slot]
+            if v is undefined:
+                error("Variable was not defined.", 54)
+            return v
+        v = self.frameOf(arg.frame).get(arg.name)
+        if v is None:
+            error("Variable was not defined.", 54)
+        return v
+
+    def indexWrite(self, item: tuple, arg: Argument):
+        self.find(arg).item = item
+
+    def symb(self, arg: Argument) -> tuple:
+        if arg.type == "var":
+            var = self.find(arg)
+            nonDeclared(var)
+            return var.item
+        return arg.item
 
-    if val1 == "true" and val2 == "true":
-        indexWrite("true", 'bool', instruction.arguments[0].value)
-    else:
-        indexWrite("false", 'bool', instruction.arguments[0].value)
+    #instructions
+    def MOVE(self, instruction: Instruction):
+        self.indexWrite(share(self.symb(instruction.arguments[1])), instruction.arguments[0])
 
-def OR(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "bool":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "bool":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
+    def CREATEFRAME(self, instruction: Instruction):
+        self.initTF()
 
-    if val1 == "true" or val2 == "true":
-        indexWrite("true", 'bool', instruction.arguments[0].value)
-    else:
-        indexWrite("false", 'bool', instruction.arguments[0].value)
+    def PUSHFRAME(self, instruction: Instruction):
+        if self.tf is None:
+            error("Temporary frame does not exist.", 55)
+        self.frameStack.append(self.lf)
+        self.lf = self.tf
+        self.tf = None
 
-def NOT(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
+    def POPFRAME(self, instruction: Instruction):
+        if self.lf is None:
+            error("Local frame does not exist.", 55)
+        if len(self.frameStack) == 0:
+            error("Frame stack is empty.", 56)
+        self.tf = self.lf
+        self.lf = self.frameStack.pop()
+
+    def DEFVAR(self, instruction: Instruction):
+        arg = instruction.arguments[0]
+        var = Variable(arg.frame, arg.name)
+        if var.frame == "GF@":
+            self.existedGF(var)
+            self.addGF(var)
+            self.globals[arg.slot] = var
+        elif var.frame == "LF@":
+            self.existedLF(var)
+            self.addLF(var)
+        elif var.frame == "TF@":
+            self.existedTF(var)
+            self.addTF(var)
+        else:
+            error("Wrong frame of variable.", 52)
+
+    def CALL(self, instruction: Instruction):
+        self.callStack.append(instruction.index + 1)
+        return instruction.target
+
+    def RETURN(self, instruction: Instruction):
+        if len(self.callStack) == 0:
+            error("Call stack is empty.", 56)
+        return self.callStack.pop()
+
+    def PUSHS(self, instruction: Instruction):
+        self.dataStack.append(share(self.symb(instruction.arguments[0])))
+
+    def POPS(self, instruction: Instruction):
+        if len(self.dataStack) == 0:
+            error("Data stack is empty.", 56)
+        self.indexWrite(self.dataStack.pop(), instruction.arguments[0])
+
+    def ADD(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "int" or typ2 != "int":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(("int", val1 + val2), instruction.arguments[0])
+
+    def SUB(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "int" or typ2 != "int":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(("int", val1 - val2), instruction.arguments[0])
+
+    def MUL(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "int" or typ2 != "int":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(("int", val1 * val2), instruction.arguments[0])
+
+    def IDIV(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "int" or typ2 != "int":
+            error("Wrong type of operand.", 53)
+        if val2 == 0:
+            error("Can't divide with zero.", 57)
+        self.indexWrite(("int", val1 // val2), instruction.arguments[0])
+
+    def LT(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != typ2 or typ1 == "nil":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(TRUE if val1 < val2 else FALSE, instruction.arguments[0])
+
+    def GT(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != typ2 or typ1 == "nil":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(TRUE if val1 > val2 else FALSE, instruction.arguments[0])
+
+    def EQ(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        self.indexWrite(TRUE if equal(typ1, val1, typ2, val2) else FALSE, instruction.arguments[0])
+
+    def AND(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "bool" or typ2 != "bool":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(TRUE if val1 and val2 else FALSE, instruction.arguments[0])
+
+    def OR(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "bool" or typ2 != "bool":
+            error("Wrong type of operand.", 53)
+        self.indexWrite(TRUE if val1 or val2 else FALSE, instruction.arguments[0])
+
+    def NOT(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
         if typ1 != "bool":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if val1 == "true":
-        indexWrite("false", 'bool', instruction.arguments[0].value)
-    else:
-        indexWrite("true", 'bool', instruction.arguments[0].value)
+            error("Wrong type of operand.", 53)
+        self.indexWrite(FALSE if val1 else TRUE, instruction.arguments[0])
 
-def INT2CHAR(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var = find(instruction.arguments[1].value)
-        nonDeclared(var)
-        typ = var.type
+    def INT2CHAR(self, instruction: Instruction):
+        typ, val = self.symb(instruction.arguments[1])
         if typ != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val = var.value
-    else:
-        typ = instruction.arguments[1].type
-        val = instruction.arguments[1].value
+            error("Wrong type of operand.", 53)
+        try:
+            val = chr(val)
+        except (ValueError, OverflowError):
+            error("Wrong value of char.", 58)
+        self.indexWrite(("string", val), instruction.arguments[0])
+
+    def STRI2INT(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "string" or typ2 != "int":
+            error("Wrong type of operand.", 53)
+        if val2 < 0 or val2 >= len(val1):
+            error("Index is out of range.", 58)
+        self.indexWrite(("int", ord(val1[val2])), instruction.arguments[0])
+
+    def READ(self, instruction: Instruction):
+        typ = instruction.arguments[1].value
+        val = self.input.readline()
+        if val is None:   # EOF
+            typ = "nil"
+        elif len(val) > self.maxString:
+            error("String limit exceeded.", limitExit)
 
-    try:
-        val = chr(int(val))
-    except:
-        sys.stderr.write("ERROR: Wrong type of operand.\n")
-        exit(58)
-
-    indexWrite(val, "string", instruction.arguments[0].value)
-
-def STRI2INT(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
+        if typ == "int":
+            try:
+                val = int(val)  # decimal only, 0x and 0o are accepted just in int@ literals
+            except ValueError:
+                val = None
+                typ = "nil"
+        elif typ == "bool":
+            val = val.upper() == "TRUE"
+        elif typ == "nil":
+            val = None
+
+        self.indexWrite((typ, val), instruction.arguments[0])
+
+    def WRITE(self, instruction: Instruction):
+        typ, val = self.symb(instruction.arguments[0])
+        self.out.write(toStr(typ, val))
+
+    def CONCAT(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "string" or typ2 != "string":
+            error("Wrong type of operand.", 53)
+        if len(val1) + len(val2) > self.maxString:
+            error("String limit exceeded.", limitExit)
+        var = self.find(instruction.arguments[0])
+        owned = type(val1) is Rope and val1.owner is var    # CONCAT x x y, x keeps the rope for itself
+        val = concat(val1, val2)
+        if owned:
+            val.owner = var
+        var.item = ("string", val)
+
+    def STRLEN(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
         if typ1 != "string":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-
-    try:
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-    
-    try:
-        val1 = ord(val1[val2])
-    except:
-        sys.stderr.write("ERROR: Index is too high.\n")
-        exit(58)
-
-    indexWrite(val1, "string", instruction.arguments[0].value)
-
-    
-
-def READ(instruction: Instruction):
-    
-
-    #type - int, bool, string or nil
-    typ = instruction.arguments[1].value
-    if typ not in ["int", "bool", "string", "nil"]:
-        sys.stderr.write("ERROR: Wrong value of type.\n")
-        exit(32)
-    try: val = input()
-    except: 
-        val = "nil"
-        typ = "nil"
+            error("Wrong type of operand.", 53)
+        self.indexWrite(("int", len(val1)), instruction.arguments[0])
+
+    def GETCHAR(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if typ1 != "string" or typ2 != "int":
+            error("Wrong type of operand.", 53)
+        if val2 < 0 or val2 >= len(val1):
+            error("Index is out of range.", 58)
+        self.indexWrite(("string", val1[val2]), instruction.arguments[0])
+
+    def SETCHAR(self, instruction: Instruction):
+        var = self.find(instruction.arguments[0])
+        nonDeclared(var)
+        typ1, val1 = var.item
+        typ2, val2 = self.symb(instruction.arguments[1])
+        typ3, val3 = self.symb(instruction.arguments[2])
+        if typ1 != "string" or typ2 != "int" or typ3 != "string":
+            error("Wrong type of operand.", 53)
+        if val2 < 0 or val2 >= len(val1) or len(val3) == 0:
+            error("Index is out of range.", 58)
+        if len(val1) < ropeSize:
+            var.item = ("string", str(val1)[:val2] + val3[0] + str(val1)[val2+1:])
+            return
+        if type(val1) is not Rope or val1.owner is not var or not val1.chars:
+            val1 = Rope(list(str(val1)), len(val1), len(val1), True)     # private copy of the string, changed in place
+            val1.owner = var
+            var.item = ("string", val1)
+        val1.setChar(val2, val3[0])
+
+    def TYPE(self, instruction: Instruction):
+        arg = instruction.arguments[1]
+        typ = self.find(arg).getType() if arg.type == "var" else arg.type
+        self.indexWrite(("string", typ or ""), instruction.arguments[0])
+
+    def LABEL(self, instruction: Instruction):
+        return
 
-    if typ == "int":
-        try: int(val)
-        except:
-            val = "nil"
-            typ = "nil"
-    elif typ == "string":
-        try: str(val)
-        except:
-            val = "nil"
-            typ = "nil"
-    elif typ == "bool":
-        if val.upper() != "TRUE":
-            val = "false"
-        else:
-            val = "true"
+    def JUMP(self, instruction: Instruction):
+        return instruction.target
 
-    indexWrite(val, typ, instruction.arguments[0].value)
+    def JUMPIFEQ(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if equal(typ1, val1, typ2, val2):
+            return instruction.target
 
+    def JUMPIFNEQ(self, instruction: Instruction):
+        typ1, val1 = self.symb(instruction.arguments[1])
+        typ2, val2 = self.symb(instruction.arguments[2])
+        if not equal(typ1, val1, typ2, val2):
+            return instruction.target
 
+    def EXIT(self, instruction: Instruction):
+        typ, val = self.symb(instruction.arguments[0])
+        if typ != "int":
+            error("Wrong type of operand.", 53)
+        if val < 0 or val > 49:
+            error("Non-valid exit value.", 57)
+        raise InterpretExit(val)
+
+    def DPRINT(self, instruction: Instruction):
+        typ, val = self.symb(instruction.arguments[0])
+        self.out.flush()
+        self.stderr.write(toStr(typ, val))
+
+    def BREAK(self, instruction: Instruction):
+        self.out.flush()
+        self.stderr.write("Position in code: " + str(instruction.line) + "\n")
+        self.stderr.write("Global frame: \n")
+        for j in self.gf:
+            self.stderr.write(str(j) + "\n")
 
-def WRITE(instruction: Instruction):
-    if instruction.arguments[0].type != "var":
-        val = instruction.arguments[0].value
-        typ = instruction.arguments[0].type
-    else:
-        attr = find(instruction.arguments[0].value)
-        nonDeclared(attr)
-        val = attr.value
-        typ = attr.type
-    
-    val = str(val)
-    if typ == "nil":
-        val = ""
-    elif typ == "string":
-        val = val.replace("\\010", "\n")
-        val = val.replace("\\032", " ")
-        val = val.replace("\\035", "#")
-        val = val.replace("\\092", "\\")
-    
-    print(val, end="")
-
-def CONCAT(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if typ1 != "string":
-        sys.stderr.write("ERROR: Wrong type of operand.\n")
-        exit(53)
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
 
-    if typ2 != "string":
-        sys.stderr.write("ERROR: Wrong type of operand.\n")
-        exit(53)
-    
-    indexWrite(val1+val2, "string", instruction.arguments[0].value)
-
-def STRLEN(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-    
-    if typ1 != "string":
-        sys.stderr.write("ERROR: Wrong type of operand.\n")
-        exit(53)
+validInst = { 
+    "MOVE": {"name": Interpreter.MOVE, "argv": 2, "arg1": argVar, "arg2": argSymb, "arg3": None},
+    "CREATEFRAME": {"name": Interpreter.CREATEFRAME, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
+    "PUSHFRAME": {"name": Interpreter.PUSHFRAME, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
+    "POPFRAME": {"name": Interpreter.POPFRAME, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
+    "DEFVAR": {"name": Interpreter.DEFVAR, "argv": 1, "arg1": argVar, "arg2": None, "arg3": None},
+    "CALL": {"name": Interpreter.CALL, "argv": 1, "arg1": argLabel, "arg2": None, "arg3": None},
+    "RETURN": {"name": Interpreter.RETURN, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
+    "PUSHS": {"name": Interpreter.PUSHS, "argv": 1, "arg1": argSymb, "arg2": None, "arg3": None},
+    "POPS": {"name": Interpreter.POPS, "argv": 1, "arg1": argVar, "arg2": None, "arg3": None},
+    "ADD": {"name": Interpreter.ADD, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
+    "SUB": {"name": Interpreter.SUB, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
+    "MUL": {"name": Interpreter.MUL, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
+    "IDIV": {"name": Interpreter.IDIV, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
+    "LT": {"name": Interpreter.LT, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
+    "GT": {"name": Interpreter.GT, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
+    "EQ": {"name": Interpreter.EQ, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
+    "AND": {"name": Interpreter.AND, "argv": 3, "arg1": argVar, "arg2": argBool, "arg3": argBool},
+    "OR": {"name": Interpreter.OR, "argv": 3, "arg1": argVar, "arg2": argBool, "arg3": argBool},
+    "NOT": {"name": Interpreter.NOT, "argv": 2, "arg1": argVar, "arg2": argBool, "arg3": None},
+    "INT2CHAR": {"name": Interpreter.INT2CHAR, "argv": 2, "arg1": argVar, "arg2": argInt, "arg3": None},
+    "STRI2INT": {"name": Interpreter.STRI2INT, "argv": 3, "arg1": argVar, "arg2": argString, "arg3": argInt},
+    "READ": {"name": Interpreter.READ, "argv": 2, "arg1": argVar, "arg2": argType, "arg3": None},
+    "WRITE": {"name": Interpreter.WRITE, "argv": 1, "arg1": argSymb, "arg2": None, "arg3": None},
+    "CONCAT": {"name": Interpreter.CONCAT, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
+    "STRLEN": {"name": Interpreter.STRLEN, "argv": 2, "arg1": argVar, "arg2": argString, "arg3": None},
+    "GETCHAR": {"name": Interpreter.GETCHAR, "argv": 3, "arg1": argVar, "arg2": argString, "arg3": argInt},
+    "SETCHAR": {"name": Interpreter.SETCHAR, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argString},
+    "TYPE": {"name": Interpreter.TYPE, "argv": 2, "arg1": argVar, "arg2": argSymb, "arg3": None},
+    "LABEL": {"name": Interpreter.LABEL, "argv": 1, "arg1": argLabel, "arg2": None, "arg3": None},
+    "JUMP": {"name": Interpreter.JUMP, "argv": 1, "arg1": argLabel, "arg2": None, "arg3": None},
+    "JUMPIFEQ": {"name": Interpreter.JUMPIFEQ, "argv": 3, "arg1": argLabel, "arg2": argSymb, "arg3": argSymb},
+    "JUMPIFNEQ": {"name": Interpreter.JUMPIFNEQ, "argv": 3, "arg1": argLabel, "arg2": argSymb, "arg3": argSymb},
+    "EXIT": {"name": Interpreter.EXIT, "argv": 1, "arg1": argInt, "arg2": None, "arg3": None},
+    "DPRINT": {"name": Interpreter.DPRINT, "argv": 1, "arg1": argSymb, "arg2": None, "arg3": None},
+    "BREAK": {"name": Interpreter.BREAK, "argv": 0,"arg1": None, "arg2": None, "arg3": None},
     
-    indexWrite(len(val1), "int", instruction.arguments[0].value)
+ }
 
-def GETCHAR(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "string":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-    
+fusedInst = {("PUSHS", "POPS"): Interpreter.PUSHS_POPS, ("DEFVAR", "MOVE"): Interpreter.DEFVAR_MOVE,
+             ("LT", "JUMPIFEQ"): Interpreter.LT_JUMP, ("LT", "JUMPIFNEQ"): Interpreter.LT_JUMP,
+             ("GT", "JUMPIFEQ"): Interpreter.GT_JUMP, ("GT", "JUMPIFNEQ"): Interpreter.GT_JUMP,
+             ("EQ", "JUMPIFEQ"): Interpreter.EQ_JUMP, ("EQ", "JUMPIFNEQ"): Interpreter.EQ_JUMP}
+
+fastInst = {name: getattr(Interpreter, name + "_FAST") for name in ("MOVE", "ADD", "SUB", "MUL", "IDIV", "LT", "GT", "EQ",
+            "AND", "OR", "NOT", "STRLEN", "JUMPIFEQ", "JUMPIFNEQ")}
+
+quickInst = {Interpreter.LT: Interpreter.LT_QUICK, Interpreter.GT: Interpreter.GT_QUICK, Interpreter.EQ: Interpreter.EQ_QUICK,
+             Interpreter.JUMPIFEQ: Interpreter.JUMPIFEQ_QUICK, Interpreter.JUMPIFNEQ: Interpreter.JUMPIFNEQ_QUICK,
+             Interpreter.LT_JUMP: Interpreter.LT_JUMP_QUICK, Interpreter.GT_JUMP: Interpreter.GT_JUMP_QUICK,
+             Interpreter.EQ_JUMP: Interpreter.EQ_JUMP_QUICK}
+
+def quicken(program: Program):
+    # instructions with generic handlers and constant or GF operands start as ADAPTIVE, quick keeps the generic handler
+    for block in program.blocks:
+        for handler, instruction in block.body + [block.last]:
+            if handler not in quickInst or program.code[instruction.index][0] is not handler:
+                continue    # check-free already, or the fused pair is split by the end of the block
+            if any(arg.item is None and arg.slot is None for arg in instruction.arguments[1:]):
+                continue
+            instruction.quick = handler
+            program.code[instruction.index] = (Interpreter.ADAPTIVE, instruction)
+            if block.last[1] is instruction:
+                block.last = (Interpreter.ADAPTIVE, instruction)
+            else:
+                block.body[block.body.index((handler, instruction))] = (Interpreter.ADAPTIVE, instruction)
+
+# handlers of --stats which record peaks of variables and stacks
+trackedInst = {"DEFVAR": Interpreter.trackDEFVAR, "PUSHS": Interpreter.trackPUSHS,
+               "PUSHFRAME": Interpreter.trackPUSHFRAME, "POPFRAME": Interpreter.trackPOPFRAME, "CALL": Interpreter.trackCALL}
+
+def trackBlocks(blockAt: list, code: list):
+    # swaps the handlers of trackedInst into the blocks of a run, DEFVAR_MOVE and PUSHS_POPS run as two steps;
+    # check-free, quickened and the other fused handlers stay
+    for block in blockAt:
+        if block is None:
+            continue
+        steps = []
+        for handler, instruction in block.body + [block.last]:
+            if instruction.name not in trackedInst:
+                steps.append((handler, instruction))
+                continue
+            steps.append((trackedInst[instruction.name], instruction))
+            if instruction.fused is not None and handler is not validInst[instruction.name]["name"]:
+                steps.append(code[instruction.index + 1])  # the second instruction of the pair
+        block.body = steps[:-1]
+        block.last = steps[-1]
+
+def compileProgram(sF, cacheDir=None, fused=True, optimized=True, native=False, specialized=True, quickened=True) -> Program:
+    cacheFile = None
+    if cacheDir is not None:
+        if not sF.seekable():
+            sF = io.BytesIO(sF.read())
+        cacheFile = cachePath(cacheDir, sF)
+    program = None if cacheFile is None else loadCache(cacheFile)
+    fromCache = program is not None
+    if not fromCache:
+        program = loadProgram(sF)
+    decode(program)
+    resolveLabels(program)
+    if cacheFile is not None and not fromCache:
+        saveCache(program, cacheFile)
+    if optimized:
+        optimize(program)
+    if fused:
+        fuse(program)
+    buildBlocks(program)
+    if specialized:
+        specialize(program)
+        buildBlocks(program)    # blocks with the new handlers
+    if quickened:
+        quicken(program)
+    if native:
+        program.native = translate(program)
+    return program
+
+def interpret(sF, iF, out, err, cacheDir=None, fused=True, optimized=True, native=False, blocks=None, specialized=True,
+              quickened=True, **options) -> int:
     try:
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-    
+        program = compileProgram(sF, cacheDir, fused, optimized, native, specialized, quickened)
+    except InterpretExit as e:
+        err.write("ERROR: " + e.message + "\n")
+        return e.code
+    if blocks is not None:
+        dumpBlocks(program, blocks)
+    interpreter = Interpreter(program, iF, out, err, **options)
+    code = interpreter.run()
+    if interpreter.profile is not None:
+        writeProfile(interpreter, interpreter.profile)
+    if interpreter.stats is not None:
+        writeStats(interpreter, interpreter.stats)
+    return code
+
+def blockCounts(blockAt: list, runs: list, stop) -> list:
+    # every instruction runs as many times as its block; stop ended the program inside a block by an error, EXIT
+    # or a limit, the instructions of that block up to stop ran once more
+    counts = []
+    count = 0
+    for i, block in enumerate(blockAt):
+        if block is not None:
+            count = runs[i]
+        counts.append(count)
+    if stop is not None:
+        i = stop.index
+        counts[i] += 1
+        while blockAt[i] is None:
+            i -= 1
+            counts[i] += 1
+    return counts
+
+def unfusedCode(code: list, tracked: bool) -> list:
+    # without superinstructions, so that every instruction runs and is counted alone; check-free and quickened
+    # handlers of single instructions stay, with tracked the handlers which change stacks record peaks for --stats
+    return [((trackedInst.get(instruction.name) if tracked else None) or
+             (validInst[instruction.name]["name"] if instruction.fused is not None else handler), instruction)
+            for handler, instruction in code]
+
+def writeStats(interpreter: Interpreter, path: str):
+    import json
+    code = interpreter.program.code
+    counts = interpreter.counts or [0] * len(code)
+    hottest = max(range(len(code)), key=counts.__getitem__, default=None)
+    stats = {"instructions": sum(counts),
+             "peakDefinedVariables": interpreter.peakVars,
+             "peakDataStack": interpreter.peakData,
+             "peakFrameStack": interpreter.peakFrames,
+             "peakCallStack": interpreter.peakCalls,
+             "specialized": interpreter.program.specialized,
+             "specializedShare": round(interpreter.program.specialized / len(code), 4) if code else 0.0,
+             "quickened": interpreter.quickened,
+             "deoptimized": interpreter.deoptimized,
+             "hottest": None if hottest is None or counts[hottest] == 0 else
+                {"order": code[hottest][1].order, "opcode": code[hottest][1].name, "count": counts[hottest]}}
     try:
-        res = val1[val2]
-    except:
-        sys.stderr.write("ERROR: Index is too high.\n")
-        exit(58)
-
-    indexWrite(res, "string", instruction.arguments[0].value)
-
-def SETCHAR(instruction: Instruction):
-    if instruction.arguments[0].type == "var":
-        var1 = find(instruction.arguments[0].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        if typ1 != "string":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[0].type
-        val1 = instruction.arguments[0].value
-
-    if instruction.arguments[1].type == "var":
-        var2 = find(instruction.arguments[1].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        if typ2 != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[1].type
-        val2 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var3 = find(instruction.arguments[2].value)
-        nonDeclared(var3)
-        typ3 = var3.type
-        if typ3 != "string":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-        val3 = var3.value
-    else:
-        typ3 = instruction.arguments[2].type
-        val3 = instruction.arguments[2].value
-
+        with open(path, mode = "w") as f:
+            json.dump(stats, f, indent=2)
+    except OSError:
+        error("Can't write " + path + " file.", 12)
+
+# profile - report of --profile, text sorted by time and the same data in JSON
+def profileData(interpreter: Interpreter) -> dict:
+    code = interpreter.program.code
+    counts = interpreter.counts or [0] * len(code)
+    times = interpreter.times or [0] * len(code)
+    opcodes = {}
+    instructions = []
+    for i, (handler, instruction) in enumerate(code):
+        if counts[i] == 0:
+            continue
+        op = opcodes.setdefault(instruction.name, {"opcode": instruction.name, "count": 0, "time": 0})
+        op["count"] += counts[i]
+        op["time"] += times[i]
+        instructions.append({"order": instruction.order, "opcode": instruction.name, "count": counts[i], "time": times[i]})
+    labels = {line: name for name, line in interpreter.program.labels.items()}
+    loops = []
+    for (start, jump), count in (interpreter.loops or {}).items():
+        loops.append({"label": labels.get(start), "from": code[start][1].order, "to": code[jump][1].order,
+                      "iterations": count, "time": sum(times[start:jump + 1])})
+    for items in (opcodes.values(), instructions, loops):
+        for item in items:
+            item["time"] = round(item["time"] / 1e9, 6)     # seconds
+    byTime = lambda item: -item["time"]
+    return {"instructions": sum(counts), "time": round(sum(times) / 1e9, 6),
+            "opcodes": sorted(opcodes.values(), key=byTime),
+            "orders": sorted(instructions, key=byTime),
+            "loops": sorted(loops, key=byTime)}
+
+def writeProfile(interpreter: Interpreter, path: str):
+    import json
+    data = profileData(interpreter)
+    total = data["time"] or 1
+    lines = ["Executed instructions: %d, time: %.6f s" % (data["instructions"], data["time"]), "",
+             "%-12s %12s %12s %7s" % ("opcode", "count", "time [s]", "time %")]
+    for op in data["opcodes"]:
+        lines.append("%-12s %12d %12.6f %6.1f%%" % (op["opcode"], op["count"], op["time"], 100 * op["time"] / total))
+    lines += ["", "%-8s %-12s %12s %12s %7s" % ("order", "opcode", "count", "time [s]", "time %")]
+    for inst in data["orders"]:
+        lines.append("%-8d %-12s %12d %12.6f %6.1f%%" % (inst["order"], inst["opcode"], inst["count"], inst["time"], 100 * inst["time"] / total))
+    lines += ["", "%-20s %-15s %12s %12s %7s" % ("loop", "orders", "iterations", "time [s]", "time %")]
+    for loop in data["loops"]:
+        lines.append("%-20s %-15s %12d %12.6f %6.1f%%" % (loop["label"], "%d-%d" % (loop["from"], loop["to"]), loop["iterations"], loop["time"], 100 * loop["time"] / total))
     try:
-        val2 = int(val2)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
-
+        with open(path, mode = "w") as f:
+            f.write("\n".join(lines) + "\n")
+        with open(path + ".json", mode = "w") as f:
+            json.dump(data, f, indent=2)
+    except OSError:
+        error("Can't write " + path + " file.", 12)
+
+# batch mode - many source/input pairs in one process
+def runCase(source: str, inputFile, cacheDir, options: dict) -> dict:
+    out = io.StringIO()
+    err = io.StringIO()
+    start = time.perf_counter()
     try:
-        val1 = val1[:val2] + val3[0] + val1[val2+1:]
-    except:
-        sys.stderr.write("ERROR: Index is too high.\n")
-        exit(58)
-
-    indexWrite(val1, "string", instruction.arguments[0].value)
-
-
-def TYPE(instruction: Instruction):
-    if instruction.arguments[1].type == "var":
-        var = find(instruction.arguments[1].value)
-        if var.value is None or var.type is None:
-            val = ''
-            typ = ''
-        else:
-            val = var.value
-            typ = var.type
-    else:
-        typ = instruction.arguments[1].type
-        val = instruction.arguments[1].value
-
-    if typ not in ["int", "string", "bool", "nil", '']:
-        sys.stderr.write("ERROR: Wrong type of operand.\n")
-        exit(57)
-
-    indexWrite(typ, "string", instruction.arguments[0].value)
-    
-
-def LABEL(instruction: Instruction):
-    return
-
-def JUMP(instruction: Instruction):
-    global i
-    val = instruction.arguments[0].value
-    for j in p.labels:
-        if j.name == val:
-            i = j.line - 1
-            return
-    sys.stderr.write("ERROR: Wrong label.\n")
-    exit(52)    
-
-def JUMPIFEQ(instruction: Instruction):
-    global i
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-
-    if typ1 == 'nil' or typ2 == 'nil':
-        val = instruction.arguments[0].value
-        for j in p.labels:
-            if j.name == val:
-                i = j.line
-                return
-
-    if typ1 == typ2:
-        if typ1 == 'int':
-            try:
-                val1 = int(val1)
-                val2 = int(val2)
-            except:
-                sys.stderr.write("ERROR: Wrong value of int.\n")
-                exit(32)
-        if typ1 == 'string':
-            try:
-                val1 = str(val1)
-                val2 = str(val2)
-            except:
-                sys.stderr.write("ERROR: Wrong value of int.\n")
-                exit(32)
-    if typ1 != typ2:
-        sys.stderr.write("ERROR: Different types of operands.\n")
-        exit(53)
-    if val1==val2:
-        val = instruction.arguments[0].value
-        for j in p.labels:
-            if j.name == val:
-                i = j.line - 1
-                return
-        sys.stderr.write("ERROR: Wrong label.\n")
-        exit(52)
-    return 
-        
-
-def JUMPIFNEQ(instruction: Instruction):
-    global i
-    if instruction.arguments[1].type == "var":
-        var1 = find(instruction.arguments[1].value)
-        nonDeclared(var1)
-        typ1 = var1.type
-        val1 = var1.value
-    else:
-        typ1 = instruction.arguments[1].type
-        val1 = instruction.arguments[1].value
-
-    if instruction.arguments[2].type == "var":
-        var2 = find(instruction.arguments[2].value)
-        nonDeclared(var2)
-        typ2 = var2.type
-        val2 = var2.value
-    else:
-        typ2 = instruction.arguments[2].type
-        val2 = instruction.arguments[2].value
-
-    if typ1 == 'nil' or typ2 == 'nil':
-        val = instruction.arguments[0].value
-        for j in p.labels:
-            if j.name == val:
-                i = j.line
-                return
-
-    if typ1 == typ2:
-        if typ1 == 'int':
-            try:
-                val1 = int(val1)
-                val2 = int(val2)
-            except:
-                sys.stderr.write("ERROR: Wrong value of int.\n")
-                exit(32)
-        if typ1 == 'string':
-            try:
-                val1 = str(val1)
-                val2 = str(val2)
-            except:
-                sys.stderr.write("ERROR: Wrong value of int.\n")
-                exit(32)
-    if typ1 != typ2:
-        sys.stderr.write("ERROR: Different types of operands.\n")
-        exit(53)
-    if val1!=val2:
-        val = instruction.arguments[0].value
-        for j in p.labels:
-            if j.name == val:
-                i = j.line - 1
-                return
-        sys.stderr.write("ERROR: Wrong label.\n")
-        exit(52)
-    return
-
-def EXIT(instruction: Instruction):
-    if instruction.arguments[0].type != "var":
-        val = instruction.arguments[0].value
-        typ = instruction.arguments[0].type
-    else:
-        attr = find(instruction.arguments[0].value)
-        nonDeclared(attr)
-        val = attr.value
-        typ = attr.type
-    
-    if typ != "int":
-            sys.stderr.write("ERROR: Wrong type of operand.\n")
-            exit(53)
-    
-    try: val = int(val)
-    except:
-        sys.stderr.write("ERROR: Wrong value of int.\n")
-        exit(32)
+        with open(source, mode = "rb") as sF:
+            if inputFile is None:
+                iF = InputReader(text="")
+            else:
+                with open(inputFile, mode = "r") as f:
+                    iF = InputReader(text=f.read())     # preloaded, the file is closed before the run
+            code = interpret(sF, iF, out, err, cacheDir, **options)
+    except OSError as e:
+        err.write("ERROR: Can't open " + str(e.filename) + " file.\n")
+        code = 10
+    except Exception:
+        err.write(traceback.format_exc())
+        code = 99
+    return {"source": source, "input": inputFile, "code": code, "stdout": out.getvalue(),
+            "stderr": err.getvalue(), "time": round(time.perf_counter() - start, 6)}
+
+def readManifest(path: str) -> list:
+    import csv
+    try:
+        with open(path, mode = "r", newline = "") as f:
+            rows = [row for row in csv.reader(f) if row and not row[0].startswith("#")]
+    except OSError:
+        error("Can't open " + path + " file.", 10)
+    base = os.path.dirname(path)
+    cases = []
+    for row in rows:
+        source = os.path.join(base, row[0].strip())
+        inputFile = os.path.join(base, row[1].strip()) if len(row) > 1 and row[1].strip() else None
+        cases.append((source, inputFile))
+    return cases
+
+def writeReport(results: list, path):
+    import json, csv
+    if path is None:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    try:
+        with open(path, mode = "w", newline = "") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=["source", "input", "code", "stdout", "stderr", "time"])
+                writer.writeheader()
+                writer.writerows(results)
+            else:
+                json.dump(results, f, indent=2)
+    except OSError:
+        error("Can't write " + path + " file.", 12)
 
-    if val >= 0 and val < 50:
-        exit(val)
-    else:
-        sys.stderr.write("ERROR: Non-valid exit value.\n")
-        exit(57)
+def runJob(job: tuple) -> dict:
+    return runCase(*job)
 
-def DPRINT(instruction: Instruction):
-    if instruction.arguments[0].type != "var":
-        val = instruction.arguments[0].value
-        typ = instruction.arguments[0].type
+def runBatch(manifest: str, report, cacheDir, jobs=1, options={}):
+    cases = [(source, inputFile, cacheDir, options) for source, inputFile in readManifest(manifest)]
+    if jobs == 1 or len(cases) <= 1:
+        results = [runJob(case) for case in cases]
     else:
-        attr = find(instruction.arguments[0].value)
-        nonDeclared(attr)
-        val = attr.value
-        typ = attr.type
-
-    if val is None: val = ""
-    sys.stderr.write(val)
-
-def BREAK(instruction: Instruction):
-    sys.stderr.write("Position in code: " + str(instruction.line) + "\n")
-    sys.stderr.write("Global frame: \n")
-    for j in p.gf:
-        sys.stderr.write(str(j) + "\n")
- 
-
-validInst = { 
-    "MOVE": {"name": MOVE, "argv": 2, "arg1": argVar, "arg2": argSymb, "arg3": None},
-    "CREATEFRAME": {"name": CREATEFRAME, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
-    "PUSHFRAME": {"name": PUSHFRAME, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
-    "POPFRAME": {"name": POPFRAME, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
-    "DEFVAR": {"name": DEFVAR, "argv": 1, "arg1": argVar, "arg2": None, "arg3": None},
-    "CALL": {"name": CALL, "argv": 1, "arg1": argLabel, "arg2": None, "arg3": None},
-    "RETURN": {"name": RETURN, "argv": 0, "arg1": None, "arg2": None, "arg3": None},
-    "PUSHS": {"name": PUSHS, "argv": 1, "arg1": argSymb, "arg2": None, "arg3": None},
-    "POPS": {"name": POPS, "argv": 1, "arg1": argVar, "arg2": None, "arg3": None},
-    "ADD": {"name": ADD, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
-    "SUB": {"name": SUB, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
-    "MUL": {"name": MUL, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
-    "IDIV": {"name": IDIV, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argInt},
-    "LT": {"name": LT, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
-    "GT": {"name": GT, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
-    "EQ": {"name": EQ, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
-    "AND": {"name": AND, "argv": 3, "arg1": argVar, "arg2": argBool, "arg3": argBool},
-    "OR": {"name": OR, "argv": 3, "arg1": argVar, "arg2": argBool, "arg3": argBool},
-    "NOT": {"name": NOT, "argv": 2, "arg1": argVar, "arg2": argBool, "arg3": None},
-    "INT2CHAR": {"name": INT2CHAR, "argv": 2, "arg1": argVar, "arg2": argInt, "arg3": None},
-    "STRI2INT": {"name": STRI2INT, "argv": 3, "arg1": argVar, "arg2": argString, "arg3": argInt},
-    "READ": {"name": READ, "argv": 2, "arg1": argVar, "arg2": argType, "arg3": None},
-    "WRITE": {"name": WRITE, "argv": 1, "arg1": argSymb, "arg2": None, "arg3": None},
-    "CONCAT": {"name": CONCAT, "argv": 3, "arg1": argVar, "arg2": argSymb, "arg3": argSymb},
-    "STRLEN": {"name": STRLEN, "argv": 2, "arg1": argVar, "arg2": argString, "arg3": None},
-    "GETCHAR": {"name": GETCHAR, "argv": 3, "arg1": argVar, "arg2": argString, "arg3": argInt},
-    "SETCHAR": {"name": SETCHAR, "argv": 3, "arg1": argVar, "arg2": argInt, "arg3": argString},
-    "TYPE": {"name": TYPE, "argv": 2, "arg1": argVar, "arg2": argSymb, "arg3": None},
-    "LABEL": {"name": LABEL, "argv": 1, "arg1": argLabel, "arg2": None, "arg3": None},
-    "JUMP": {"name": JUMP, "argv": 1, "arg1": argLabel, "arg2": None, "arg3": None},
-    "JUMPIFEQ": {"name": JUMPIFEQ, "argv": 3, "arg1": argLabel, "arg2": argSymb, "arg3": argSymb},
-    "JUMPIFNEQ": {"name": JUMPIFNEQ, "argv": 3, "arg1": argLabel, "arg2": argSymb, "arg3": argSymb},
-    "EXIT": {"name": EXIT, "argv": 1, "arg1": argInt, "arg2": None, "arg3": None},
-    "DPRINT": {"name": DPRINT, "argv": 1, "arg1": argSymb, "arg2": None, "arg3": None},
-    "BREAK": {"name": BREAK, "argv": 0,"arg1": None, "arg2": None, "arg3": None},
-    
- }
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # map keeps results in the order of the manifest
+            results = list(pool.map(runJob, cases, chunksize=max(1, len(cases) // (jobs * 8))))
+    writeReport(results, report)
 
 def parseArgs():
-    if(len(sys.argv[1:])>2):
-        sys.stderr.write("ERROR: Wrong number of arguments.\n")
-        exit(11)
     argparser = argparse.ArgumentParser(add_help=False)
-    argparser.add_argument('--help')
+    argparser.add_argument('--help', action='store_true')
     argparser.add_argument('--source')
     argparser.add_argument('--input')
+    argparser.add_argument('--cache')
+    argparser.add_argument('--batch')
+    argparser.add_argument('--report')
+    argparser.add_argument('--jobs', type=int, default=1)
+    argparser.add_argument('--max-steps', type=int)
+    argparser.add_argument('--timeout', type=float)
+    argparser.add_argument('--max-stack', type=int)
+    argparser.add_argument('--max-string', type=int)
+    argparser.add_argument('--output-buffer', type=int, default=outputBufferSize)
+    argparser.add_argument('--profile')
+    argparser.add_argument('--stats')
+    argparser.add_argument('--no-fuse', action='store_true')
+    argparser.add_argument('--no-optimize', action='store_true')
+    argparser.add_argument('--aot', action='store_true')
+    argparser.add_argument('--cfg')
+    argparser.add_argument('--no-specialize', action='store_true')
+    argparser.add_argument('--no-quicken', action='store_true')
     args = argparser.parse_args()
+    if args.jobs <= 0:
+        args.jobs = os.cpu_count() or 1
+    if args.help and len(sys.argv[1:]) > 1:
+        error("--help can't be combined with other arguments.", 10)
+    if args.batch is not None and (args.source is not None or args.input is not None):
+        error("--batch can't be combined with --source or --input.", 10)
+    if args.batch is not None and (args.profile is not None or args.stats is not None or args.cfg is not None):
+        error("--profile, --stats and --cfg can't be combined with --batch.", 10)
     return args
 
 
-
-
-
-if __name__ == "__main__":
-    p = Program()
-
+def main():
     args = parseArgs()
     
     if args.help:
         print("IPPcode23 Interpret")
         print("--source         - source file (XML)")
         print("--input          - input file for the program")
+        print("--cache          - directory for cached loaded programs")
+        print("--batch          - CSV manifest with source,input pairs to run in one process")
+        print("--report         - JSON (or .csv) report of the batch, default is stdout")
+        print("--jobs           - number of processes for the batch, 0 means all cores")
+        print("--max-steps      - maximum number of executed instructions")
+        print("--timeout        - maximum run time of a program in seconds")
+        print("--max-stack      - maximum depth of the data, frame and call stacks")
+        print("--max-string     - maximum length of a string made by CONCAT or READ")
+        print("--output-buffer  - size of the output buffer in characters, 0 writes immediately")
+        print("--profile        - file for the profile report, JSON goes to the same name with .json")
+        print("--stats          - JSON file for statistics of the run")
+        print("--no-fuse        - don't replace common pairs of instructions with superinstructions")
+        print("--no-optimize    - don't fold constants, remove dead code and labels and thread jumps")
+        print("--aot            - translate the program to Python functions before running it")
+        print("--cfg            - file for the basic blocks of the program")
+        print("--no-specialize  - don't use check-free handlers where types of variables are known")
+        print("--no-quicken     - don't rewrite comparisons to handlers for the types seen at run time")
+        exit(0)
+
+    options = {"maxSteps": args.max_steps, "timeout": args.timeout, "maxStack": args.max_stack, "maxString": args.max_string,
+               "bufferSize": args.output_buffer, "profile": args.profile, "stats": args.stats,
+               "fused": not args.no_fuse, "optimized": not args.no_optimize, "native": args.aot, "blocks": args.cfg,
+               "specialized": not args.no_specialize, "quickened": not args.no_quicken}
+    if args.batch is not None:
+        runBatch(args.batch, args.report, args.cache, args.jobs, options)
         exit(0)
     elif args.source is None and args.input is None:
-        sys.stderr.write("ERROR: Source or input file is neccessary.\n")
-        exit(10)
+        error("Source or input file is neccessary.", 10)
     
     if args.source is not None:
         try:
-            sF = open(str(args.source), mode = "r")
+            sF = open(str(args.source), mode = "rb")
         except:
-            sys.stderr.write("ERROR: Can't open " + args.source + " file.\n")
-            exit(10)
+            error("Can't open " + args.source + " file.", 10)
     else:
-        sF = sys.stdin
+        sF = sys.stdin.buffer
 
     if args.input is not None:
         try:
             iF = open(str(args.input), mode = "r")
         except:
-            sys.stderr.write("ERROR: Can't open " + args.input + " file.\n")
-            exit(10)
-        sys.stdin = iF
+            error("Can't open " + args.input + " file.", 10)
     else:
         iF = sys.stdin
 
-    # xml load with xml.etree.ElementTree
-    try: root = ET.parse(sF).getroot()
-    except:
-        sys.stderr.write('ERROR: XML not well-formed.\n')
-        exit(31)
-
-    # xml check
-    if root.tag != 'program' or root.get('language').upper() != 'IPPCODE23':
-        sys.stderr.write('ERROR: Wrong XML - Missing program tag or language is not IPPcode23.\n')
-        exit(32)
+    exit(interpret(sF, iF, sys.stdout, sys.stderr, args.cache, **options))
 
-    root[:] = sorted(root, key=lambda child: int(child.get('order')))
-
-    line = 1
-
-    for inst in root:
-        if inst.tag != 'instruction' or inst.get('order') is None:
-            sys.stderr.write('ERROR: Wrong XML - Missing instruction tag or order.\n')
-            exit(32)
-        if validInst.get(str(inst.get('opcode')).upper(), {}).get('name') is None:
-            sys.stderr.write('ERROR: Wrong XML -Wrong opcode of instruction.\n')
-            exit(32)
-        if int(inst.attrib["order"]) <= 0:
-            sys.stderr.write('ERROR: Wrong order of instruction.\n')
-            exit(32)
-        
-        inst[:] = sorted(inst, key=lambda child: child.tag)
-
-        instruction = Instruction(inst.attrib["opcode"].upper(), int(inst.attrib["order"]), line)     #create an instrction
-
-        for argument in inst:
-            if argument.text is not None:
-                arg = Argument(fix(argument.text), argument.attrib['type'])      #create an argument
-            else:
-                arg = Argument(argument.text, argument.attrib['type'])
-            instruction.addArgument(arg)        #add the argument to instruction
 
-        p.addInstruction(instruction)       #add the instruction with arguments to the program class
-
-        if instruction.getName() == "LABEL":
-            checkLabel(instruction.arguments[0].value)
-            checkType(instruction, 1, argLabel, None, None)
-            label = Label(instruction.arguments[0].value, instruction.getLine())
-            p.addLabel(label)
-        
-        line = line + 1
-
-    i = 0
-    end = len(p.instructions)
-
-    while i < end:
-
-        op = p.instructions[i].getName()
-        argv = validInst[op]["argv"]
-        arg1 = validInst[op]["arg1"]
-        arg2 = validInst[op]["arg2"]
-        arg3 = validInst[op]["arg3"]
-        if len(p.instructions[i].arguments) != argv:
-            sys.stderr.write('ERROR: Wrong number of instruction arguments.\n')
-            exit(52)
-        
-        checkType(p.instructions[i], argv, arg1, arg2, arg3)
-        validInst[op]["name"](p.instructions[i])
-
-        i = i + 1
\ No newline at end of file
+if __name__ == "__main__":
+    try:
+        main()
+    except InterpretExit as e:
+        sys.stderr.write("ERROR: " + e.message + "\n")
+        exit(e.code)
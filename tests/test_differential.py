@@ -0,0 +1,210 @@
+# differential tests - every sample program in programs/ gives the same stdout, stderr and exit code with each
+# optimization and run loop as with all optimizations turned off, and the stdout and exit code in its .out and .code
+# usage: python -m pytest tests   or   python -m unittest discover tests
+
+import os, sys, io, json, marshal, tempfile, unittest
+from xml.sax.saxutils import escape
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+import interpret
+
+programs = os.path.join(here, "programs")
+labelInst = ("LABEL", "JUMP", "CALL", "JUMPIFEQ", "JUMPIFNEQ")    # instructions with a label as the first operand
+
+def assemble(text: str) -> bytes:
+    # IPPcode23 text, one instruction per line, to the XML read by the interpreter
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<program language="IPPcode23">']
+    for order, line in enumerate([line.split() for line in text.splitlines() if line.strip()], 1):
+        opcode, operands = line[0].upper(), line[1:]
+        args = []
+        for n, operand in enumerate(operands, 1):
+            if n == 1 and opcode in labelInst:
+                typ, value = "label", operand
+            elif n == 2 and opcode == "READ":
+                typ, value = "type", operand
+            elif operand[:3] in ("GF@", "LF@", "TF@"):
+                typ, value = "var", operand
+            else:
+                typ, value = operand.split("@", 1)
+            args.append('<arg%d type="%s">%s</arg%d>' % (n, typ, escape(value), n))
+        lines.append('<instruction order="%d" opcode="%s">%s</instruction>' % (order, opcode, "".join(args)))
+    lines.append("</program>")
+    return "\n".join(lines).encode()
+
+def sample(name: str) -> tuple:
+    # (XML source, input text) of a sample program
+    with open(os.path.join(programs, name + ".src")) as f:
+        xml = assemble(f.read())
+    inputPath = os.path.join(programs, name + ".in")
+    text = ""
+    if os.path.exists(inputPath):
+        with open(inputPath) as f:
+            text = f.read()
+    return xml, text
+
+def run(xml: bytes, text: str, cacheDir=None, **options) -> tuple:
+    out = io.StringIO()
+    err = io.StringIO()
+    code = interpret.interpret(io.BytesIO(xml), interpret.InputReader(text=text), out, err, cacheDir, **options)
+    return out.getvalue(), err.getvalue(), code
+
+reference = {"fused": False, "optimized": False, "specialized": False, "quickened": False}
+
+def variants(directory: str) -> dict:
+    # command line flags -> options of interpret()
+    stats = os.path.join(directory, "stats.json")
+    profile = os.path.join(directory, "profile.txt")
+    return {"default": {},
+            "--no-fuse": {"fused": False},
+            "--no-optimize": {"optimized": False},
+            "--no-specialize": {"specialized": False},
+            "--no-quicken": {"quickened": False},
+            "--aot": {"native": True},
+            "--aot --no-optimize --no-fuse": {"native": True, "optimized": False, "fused": False},
+            "--max-steps": {"maxSteps": 10 ** 9},
+            "--timeout --max-stack --max-string": {"timeout": 100.0, "maxStack": 10 ** 6, "maxString": 10 ** 6},
+            "--stats": {"stats": stats},
+            "--profile": {"profile": profile},
+            "--profile --stats": {"profile": profile, "stats": stats},
+            "--output-buffer 0": {"bufferSize": 0}}
+
+class DifferentialTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_samples(self):
+        names = sorted(name[:-4] for name in os.listdir(programs) if name.endswith(".src"))
+        self.assertTrue(names)
+        for name in names:
+            xml, text = sample(name)
+            expected = run(xml, text, **reference)
+            with self.subTest(name, flags="expected files"):
+                with open(os.path.join(programs, name + ".out")) as f:
+                    self.assertEqual(expected[0], f.read())
+                with open(os.path.join(programs, name + ".code")) as f:
+                    self.assertEqual(expected[2], int(f.read()))
+            for flags, options in variants(self.directory.name).items():
+                with self.subTest(name, flags=flags):
+                    self.assertEqual(run(xml, text, **options), expected)
+
+    def test_cache(self):
+        # the first run writes the cache, the second one loads the program from it
+        xml, text = sample("call")
+        expected = run(xml, text)
+        cacheDir = os.path.join(self.directory.name, "cache")
+        self.assertEqual(run(xml, text, cacheDir), expected)
+        self.assertEqual(len(os.listdir(cacheDir)), 1)
+        self.assertEqual(run(xml, text, cacheDir), expected)
+
+    def test_damaged_cache(self):
+        # entries of a wrong shape are a cache miss, the XML is loaded again
+        xml, text = sample("arith")
+        expected = run(xml, text)
+        cacheDir = os.path.join(self.directory.name, "cache")
+        run(xml, text, cacheDir)
+        path = os.path.join(cacheDir, os.listdir(cacheDir)[0])
+        for damaged in [(interpret.cacheVersion, [("ADD", 1, 1)]), (interpret.cacheVersion, [("FOO", 1, 1, ())]),
+                        (interpret.cacheVersion, [("WRITE", 1, 1, (("int", "x"),))]), (interpret.cacheVersion, 5)]:
+            with self.subTest(damaged=damaged):
+                with open(path, "wb") as f:
+                    marshal.dump(damaged, f)
+                self.assertEqual(run(xml, text, cacheDir), expected)
+
+class RegressionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def stats(self, xml: bytes, text: str, **options) -> dict:
+        path = os.path.join(self.directory.name, "stats.json")
+        run(xml, text, stats=path, **options)
+        with open(path) as f:
+            return json.load(f)
+
+    def test_reused_program(self):
+        # runs of one compiled Program start from the same handlers and counters
+        xml, text = sample("quick")
+        program = interpret.compileProgram(io.BytesIO(xml))
+        handlers = list(program.code)
+        results = []
+        for attempt in range(3):
+            interpreter = interpret.Interpreter(program, interpret.InputReader(text=text), io.StringIO(), io.StringIO())
+            results.append((interpreter.run(), interpreter.stdout.getvalue(), interpreter.quickened, interpreter.deoptimized))
+            self.assertEqual(program.code, handlers)
+        self.assertEqual(results, [results[0]] * 3)
+        self.assertGreater(results[0][2], 0)
+
+    def test_max_steps(self):
+        # the limit counts instructions like --stats, fused pairs as two
+        xml, text = sample("fact")
+        for flags in ({}, {"fused": False}, {"specialized": False, "quickened": False}, {"native": True}):
+            with self.subTest(flags=flags):
+                steps = self.stats(xml, text, **flags)["instructions"]
+                self.assertEqual(run(xml, text, maxSteps=steps, **flags)[2], 0)
+                self.assertEqual(run(xml, text, maxSteps=steps - 1, **flags)[2], interpret.limitExit)
+
+    def test_max_steps_inside_block(self):
+        # the instructions of a block before the limit still run
+        xml = assemble("WRITE int@1\nWRITE int@2\nWRITE int@3\nWRITE int@4\n")
+        self.assertEqual(run(xml, "", maxSteps=2)[::2], ("12", interpret.limitExit))
+
+    def test_profile_counts(self):
+        # --profile and --stats count both instructions of fused pairs
+        xml, text = sample("fuse")
+        path = os.path.join(self.directory.name, "profile.txt")
+        counts = []
+        for fused in (True, False):
+            run(xml, text, profile=path, fused=fused)
+            with open(path + ".json") as f:
+                counts.append(json.load(f)["instructions"])
+            counts.append(self.stats(xml, text, fused=fused)["instructions"])
+        self.assertEqual(counts, [counts[0]] * 4)
+
+    def test_break_position(self):
+        # BREAK reports the position in the loaded program also after optimize()
+        xml = assemble("LABEL a\nJUMP b\nLABEL b\nBREAK\n")
+        self.assertIn("Position in code: 4\n", run(xml, "")[1])
+        self.assertEqual(run(xml, "")[1], run(xml, "", optimized=False)[1])
+
+    def test_read_int(self):
+        # 0x and 0o are accepted only in int@ literals
+        xml = assemble("DEFVAR GF@a\nREAD GF@a int\nTYPE GF@a GF@a\nWRITE GF@a\nWRITE int@0x10\n")
+        self.assertEqual(run(xml, "0x10\n")[0], "nil16")
+
+    def test_int_literals(self):
+        # decimal, 0x and 0o with an optional sign, IPPcode23 has no binary and no underscores
+        xml = assemble("WRITE int@-0x1F\nWRITE int@+0O17\nWRITE int@007\n")
+        self.assertEqual(run(xml, "")[::2], ("-31157", 0))
+        for word in ("0b11", "1_000", "0x", "0o8", "1e3"):
+            with self.subTest(word=word):
+                self.assertEqual(run(assemble("WRITE int@" + word + "\n"), "")[2], 32)
+
+    def test_cfg_escapes(self):
+        # one line per instruction in the --cfg dump
+        xml = assemble("WRITE string@a\\010b\\032c\n")
+        path = os.path.join(self.directory.name, "cfg.txt")
+        run(xml, "", blocks=path)
+        with open(path) as f:
+            self.assertEqual(f.read().splitlines()[1].split()[-1], "string@a\\010b\\032c")
+
+    def test_peak_variables(self):
+        # POPFRAME brings the stacked LF back next to the popped frame
+        xml = assemble("CREATEFRAME\nDEFVAR TF@a1\nDEFVAR TF@a2\nDEFVAR TF@a3\nPUSHFRAME\nCREATEFRAME\nPUSHFRAME\n"
+                       "DEFVAR LF@b1\nDEFVAR LF@b2\nPOPFRAME\n")
+        for flags in ({}, {"profile": os.path.join(self.directory.name, "profile.txt")}):
+            with self.subTest(flags=flags):
+                self.assertEqual(self.stats(xml, "", **flags)["peakDefinedVariables"], 5)
+
+    def test_wrong_frame(self):
+        # a variable without GF@, LF@ or TF@ is an error 52 also in the translated code
+        for value in ("xf@a", ""):
+            xml = ('<?xml version="1.0" encoding="UTF-8"?><program language="IPPcode23"><instruction order="1" '
+                   'opcode="WRITE"><arg1 type="var">%s</arg1></instruction></program>' % value).encode()
+            with self.subTest(value=value):
+                self.assertEqual(run(xml, "", native=True), run(xml, "", **reference))
+                self.assertEqual(run(xml, "")[2], 52)
+
+if __name__ == "__main__":
+    unittest.main()